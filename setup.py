@@ -8,7 +8,6 @@ DEPENDENCIES = setup_requires = [
     "marshmallow",
     "flask",
     "flask_restful",
-    "ordered_set",
     "requests",
 ]
 
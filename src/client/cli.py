@@ -104,12 +104,19 @@ def join(email, password, group_id, group_password):
     client.join(email, password, group_id, group_password)
 
 
+@click.option(
+    "-m",
+    "--mode",
+    type=click.Choice(["max_flow", "greedy", "exact"]),
+    default="max_flow",
+    help="max_flow keeps to who owes whom; greedy and exact just settle net balances",
+)
 @click.option("--password", prompt="Group Password", hide_input=True)
 @click.argument("group_id")
 @settle.command()
-def simplify(group_id, password):
+def simplify(group_id, password, mode):
     """Simplifies debt of a group"""
-    client.simplify(group_id, password)
+    client.simplify(group_id, password, mode)
 
 
 @click.option("--password", prompt=True, hide_input=True)
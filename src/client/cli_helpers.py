@@ -49,6 +49,8 @@ def validate_response(response: requests.Response) -> None:
         )
     elif response.status_code == 403:
         raise ResourceNotFoundError(f"This action was not allowed by the server, {e}")
+    elif response.status_code == 400:
+        raise InvalidResponseError(f"The server did not understand the request, {e}")
     elif response.status_code // 100 == 5:
         raise ServerError(f"Error {response.status_code}: {response.json()['message']}")
     elif response.status_code == 202:
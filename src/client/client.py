@@ -228,13 +228,15 @@ def new_transaction(email, password, dest_email, amount, group, reference):
 
 
 @trap
-def simplify(group_id, password):
+def simplify(group_id, password, mode="max_flow"):
     """Will settle the group; can be done by anyone at anytime;
     everyone signs newly generated transactions if new transactions are generated"""
 
     helpers.auth_group(group_id, password)
 
-    response = requests.post(helpers.url(f"/simplify/{group_id}"))
+    response = requests.post(
+        helpers.url(f"/simplify/{group_id}"), params={"mode": mode}
+    )
 
     try:
         helpers.validate_response(response)
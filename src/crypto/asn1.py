@@ -0,0 +1,152 @@
+# coding=utf-8
+
+"""
+Just enough DER (ASN.1) decoding to read RSA keys out of PEM files:
+PKCS#1 and PKCS#8 private keys, and SubjectPublicKeyInfo public keys
+"""
+
+import base64
+import binascii
+import re
+
+INTEGER = 0x02
+BIT_STRING = 0x03
+OCTET_STRING = 0x04
+OID = 0x06
+SEQUENCE = 0x30
+
+# 1.2.840.113549.1.1.1, encoded
+RSA_ENCRYPTION = bytes.fromhex("2a864886f70d010101")
+
+PRIVATE_FIELDS = ("n", "e", "d", "p", "q", "exp1", "exp2", "crt_coef")
+"""Integers of a PKCS#1 private key, after its version, as RSAKeyLoader labels them"""
+
+PEM = re.compile(
+    rb"-----BEGIN ([A-Z ]+)-----\s*(.*?)\s*-----END \1-----", flags=re.DOTALL
+)
+
+
+class ASN1Error(Exception):
+    """Data isn't DER / PEM, or isn't the structure expected"""
+
+
+def read_pem(data: bytes) -> tuple[str, bytes]:
+    """Label (e.g. "RSA PRIVATE KEY") and DER bytes of the first PEM block in data"""
+    if (match := PEM.search(data)) is None:
+        raise ASN1Error("No PEM block found")
+
+    label, body = match.groups()
+    try:
+        return label.decode("ascii"), base64.b64decode(body, validate=False)
+    except binascii.Error as e:
+        raise ASN1Error(f"PEM body isn't base64; {e}")
+
+
+def read(der: bytes, offset: int = 0) -> tuple[int, bytes, int]:
+    """(tag, contents, offset of whatever comes next) of the element at offset"""
+    try:
+        tag = der[offset]
+        length = der[offset + 1]
+        offset += 2
+
+        # long form; low bits give how many bytes the length takes
+        if length & 0x80:
+            size = length & 0x7F
+            if not size or size > 4:
+                raise ASN1Error("Unsupported length")
+            length = int.from_bytes(der[offset : offset + size], "big")
+            offset += size
+    except IndexError:
+        raise ASN1Error("Ran out of data")
+
+    if offset + length > len(der):
+        raise ASN1Error("Element runs past the end of the data")
+
+    return tag, der[offset : offset + length], offset + length
+
+
+def sequence(der: bytes, *, tag: int = SEQUENCE) -> list[tuple[int, bytes]]:
+    """(tag, contents) of each element inside the single element that is der"""
+    outer, contents, end = read(der)
+    if outer != tag or end != len(der):
+        raise ASN1Error(f"Expected one element tagged {tag:#x}")
+
+    elements = []
+    offset = 0
+    while offset < len(contents):
+        inner, value, offset = read(contents, offset)
+        elements.append((inner, value))
+    return elements
+
+
+def integers(elements: list[tuple[int, bytes]]) -> list[int]:
+    if any(tag != INTEGER for tag, _ in elements):
+        raise ASN1Error("Expected integers")
+    return [int.from_bytes(value, "big", signed=True) for _, value in elements]
+
+
+def rsa_private_key(der: bytes) -> dict[str, int]:
+    """PKCS#1 RSAPrivateKey; {n, e, d, p, q, exp1, exp2, crt_coef}"""
+    version, *numbers = integers(sequence(der))
+    if version != 0 or len(numbers) != len(PRIVATE_FIELDS):
+        # version 1 is multi prime
+        raise ASN1Error("Not a two prime RSA private key")
+    return dict(zip(PRIVATE_FIELDS, numbers))
+
+
+def rsa_public_key(der: bytes) -> dict[str, int]:
+    """PKCS#1 RSAPublicKey; {n, e}"""
+    numbers = integers(sequence(der))
+    if len(numbers) != 2:
+        raise ASN1Error("Not an RSA public key")
+    return dict(zip(("n", "e"), numbers))
+
+
+def _check_algorithm(element: tuple[int, bytes]) -> None:
+    """AlgorithmIdentifier has to be rsaEncryption"""
+    tag, contents = element
+    if tag != SEQUENCE or read(contents)[:2] != (OID, RSA_ENCRYPTION):
+        raise ASN1Error("Not an RSA key")
+
+
+def private_key_info(der: bytes) -> dict[str, int]:
+    """PKCS#8 PrivateKeyInfo, wrapping a PKCS#1 private key"""
+    elements = sequence(der)
+    if len(elements) < 3 or elements[2][0] != OCTET_STRING:
+        raise ASN1Error("Not a PKCS#8 private key")
+
+    _check_algorithm(elements[1])
+    return rsa_private_key(elements[2][1])
+
+
+def public_key_info(der: bytes) -> dict[str, int]:
+    """SubjectPublicKeyInfo, wrapping a PKCS#1 public key"""
+    elements = sequence(der)
+    if len(elements) != 2 or elements[1][0] != BIT_STRING:
+        raise ASN1Error("Not a SubjectPublicKeyInfo public key")
+
+    _check_algorithm(elements[0])
+    # first byte of a bit string is its count of unused bits
+    bits = elements[1][1]
+    if not bits or bits[0]:
+        raise ASN1Error("Malformed public key bit string")
+    return rsa_public_key(bits[1:])
+
+
+# PEM label: (parser, private?)
+PARSERS = {
+    "RSA PRIVATE KEY": (rsa_private_key, True),
+    "PRIVATE KEY": (private_key_info, True),
+    "RSA PUBLIC KEY": (rsa_public_key, False),
+    "PUBLIC KEY": (public_key_info, False),
+}
+
+
+def load_pem(data: bytes) -> tuple[bool, dict[str, int]]:
+    """(private?, numbers) of the RSA key in a PEM file's contents"""
+    label, der = read_pem(data)
+    if label not in PARSERS:
+        raise ASN1Error(f"Can't read {label!r} PEM files")
+
+    parser, private = PARSERS[label]
+    return private, parser(der)
@@ -0,0 +1,76 @@
+# coding=utf-8
+
+"""
+Checks many signatures at once; checks the cache hasn't seen are split into chunks
+and fanned out over a process pool. Every check gets a result, failures included
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Sequence
+
+from src.crypto import cache as caches
+
+check = tuple[bytes, bytes | int, int, int]
+"""(hash, signature, n, e); passes if the signature undoes to hash under key (n, e)"""
+
+parallel_threshold = 256
+"""Fewest uncached checks worth starting a process pool for"""
+
+
+def verify(
+    checks: Sequence[check],
+    *,
+    workers: int | None = None,
+    chunksize: int = 64,
+    cache: caches.VerificationCache | None = caches.verifications,
+) -> list[bool]:
+    """Pass / fail for each check, in order.
+
+    Results are looked up in, and go back into, cache (None to skip it), which is
+    grown to fit every check if need be (up to its ceiling), so they don't push each
+    other out. If what's left is at least parallel_threshold checks, they are
+    checked `chunksize` at a time across `workers` processes (default: one per CPU);
+    workers = 1 keeps everything in this process"""
+    if cache is not None:
+        cache.reserve(len(checks))
+
+    results: list[bool | None] = [
+        None if cache is None else cache.lookup(*item) for item in checks
+    ]
+    todo = [n for n, valid in enumerate(results) if valid is None]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers > 1 and len(todo) >= parallel_threshold:
+        chunks = [
+            [checks[n] for n in todo[start : start + chunksize]]
+            for start in range(0, len(todo), chunksize)
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            checked = [
+                valid for done in pool.map(_check_chunk, chunks) for valid in done
+            ]
+    else:
+        checked = _check_chunk([checks[n] for n in todo])
+
+    for n, valid in zip(todo, checked):
+        results[n] = valid
+        if cache is not None:
+            cache.store(*checks[n], valid)
+
+    return results  # type: ignore
+
+
+def _check_chunk(chunk: list[check]) -> list[bool]:
+    """Top level, so it can be sent to a process pool"""
+    return [_check_one(item) for item in chunk]
+
+
+def _check_one(item: check) -> bool:
+    try:
+        return caches.check(*item)
+    except (ValueError, TypeError):
+        # not a key / signature at all, e.g. a modulus of 0
+        return False
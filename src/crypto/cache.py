@@ -0,0 +1,121 @@
+# coding=utf-8
+
+"""
+Bounded LRU cache of signature checks, so a signature is only ever checked against
+a key once. Keyed by (digest, signature, key fingerprint); any change to what was
+signed, the signature or the key is a miss, and gets checked for real
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from src.crypto import hashes, keys, rsa
+
+
+@dataclass(frozen=True)
+class CacheInfo:
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+
+
+entry = tuple[bytes, bytes | int, bytes]
+"""(digest, signature, key fingerprint)"""
+
+
+def fingerprint(n: int, e: int) -> bytes:
+    """SHA3 of a public key's n and e"""
+    hasher = hashes.Hasher(n.to_bytes((n.bit_length() + 7) // 8, "big"))
+    hasher.update(b"|" + e.to_bytes((e.bit_length() + 7) // 8, "big"))
+    return hasher.digest().h
+
+
+def check(digest: bytes, sig: bytes | int, n: int, e: int) -> bool:
+    """Uncached RSA check of a signature against public key (n, e)"""
+    try:
+        return rsa.RSA.inv_sig(sig, keys.PublicKey(n, e), len(digest)) == digest
+    except OverflowError:
+        # undoes to something longer than digest, so can't be a signature of it
+        return False
+
+
+class VerificationCache:
+    """Results of RSA signature checks, least recently used dropped past maxsize;
+    safe to share between threads"""
+
+    def __init__(self, maxsize: int = 4096, ceiling: int = 32768):
+        self.maxsize = maxsize
+        # furthest reserve() will grow maxsize
+        self.ceiling = ceiling
+        self.hits = 0
+        self.misses = 0
+
+        self._results: OrderedDict[entry, bool] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    def lookup(self, digest: bytes, sig: bytes | int, n: int, e: int) -> bool | None:
+        """Cached result of a check, None if it hasn't been done (a miss)"""
+        key = (digest, sig, fingerprint(n, e))
+
+        with self._lock:
+            if (valid := self._results.get(key)) is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._results.move_to_end(key)
+            return valid
+
+    def store(
+        self, digest: bytes, sig: bytes | int, n: int, e: int, valid: bool
+    ) -> None:
+        with self._lock:
+            self._results[digest, sig, fingerprint(n, e)] = valid
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def resize(self, maxsize: int) -> None:
+        """Changes how many results are kept, dropping the least recently used
+        ones if there are now too many"""
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._results) > maxsize:
+                self._results.popitem(last=False)
+
+    def reserve(self, size: int) -> None:
+        """Makes sure at least size results fit, e.g. every check of a group, so
+        checking a big group doesn't push its own results out; never shrinks, and
+        never grows past ceiling"""
+        if (size := min(size, self.ceiling)) > self.maxsize:
+            self.resize(size)
+
+    def check(self, digest: bytes, sig: bytes | int, n: int, e: int) -> bool:
+        """True if sig is a signature of digest by the owner of key (n, e)"""
+        if (valid := self.lookup(digest, sig, n, e)) is None:
+            # RSA done outside of the lock; a race only means checking twice
+            valid = check(digest, sig, n, e)
+            self.store(digest, sig, n, e, valid)
+        return valid
+
+    def verify(self, digest: bytes, sig: bytes | int, key: keys.any_public_key) -> bool:
+        """check(), given the public key itself"""
+        return self.check(digest, sig, key.n, key.e)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, len(self._results), self.maxsize)
+
+    def clear(self) -> None:
+        """Forgets every result, and resets the stats"""
+        with self._lock:
+            self._results.clear()
+            self.hits = self.misses = 0
+
+
+verifications = VerificationCache()
+"""Cache shared by everything that verifies transactions (Transaction.verify);
+grows to fit the biggest batch checked through it (see batch.verify), up to its
+ceiling, and can be resized up front for big groups"""
@@ -4,9 +4,12 @@
 import os
 import os.path
 import re
-import subprocess
+import threading
+import weakref
 from dataclasses import dataclass, field
 
+from src.crypto import asn1
+
 
 class RSAKeyLoaderFromNumbers:
     ...
@@ -31,45 +34,80 @@ class RSAKeyLoader:
     # initialise what we need, don't pass in anything at instantiation
     lookup: dict[str, int] = field(default_factory=lambda: {})
     key: None | str = None
+    # numbers read by load(), along with the text they were given back as
+    _loaded: tuple[str, dict[str, int]] | None = field(default=None, repr=False)
+
+    # text labels of each number, as `openssl rsa -text` prints them
+    text_labels = {
+        "n": "modulus",
+        "e": "publicExponent",
+        "d": "privateExponent",
+        "p": "prime1",
+        "q": "prime2",
+        "exp1": "exponent1",
+        "exp2": "exponent2",
+        "crt_coef": "coefficient",
+    }
 
     def load(self, path_to_private_key: str) -> str:
         """
-        Loads PEM private key from file in file path;
+        Loads PEM private key (PKCS#1 or PKCS#8) from file in file path;
+        returns the key's numbers as text, in the format parse() reads
         """
+        private, numbers = self._read(path_to_private_key)
 
-        # will only attempt to load if file exists
-        # if openssl rsa doesn't like file report as incorrect format
-
-        try:
-            if not os.path.exists(path_to_private_key):
-                raise RSAParserError(
-                    f"File not found at current path: \n{path_to_private_key}"
-                )
-            key = str(
-                subprocess.check_output(
-                    f"openssl rsa -noout -text < {path_to_private_key}", shell=True
-                )
-            )
-        except subprocess.CalledProcessError:
+        if not private:
             raise RSAParserError("File not in PEM private key format")
 
-        # strip into long easily parsable str; => remove spaces, newlines, colons
-        key = key.replace(" ", "").replace("\\n", "").replace(":", "")
+        if numbers["n"].bit_length() != 2048:
+            raise RSAParserError("File not in correct format")
+
+        return self._keep(numbers)
+
+    def load_public(self, path_to_public_key: str) -> str:
+        """
+        Loads PEM public key (SubjectPublicKeyInfo or PKCS#1) from file in file path;
+        parse() then gives n and e
+        """
+        private, numbers = self._read(path_to_public_key)
 
-        # converted from bytes so remove b' ' with slice
-        key = key[2:-1]
+        if private:
+            raise RSAParserError("File not in PEM public key format")
 
-        # split after title section, discard info
-        # pub exp is given in bin in text format; breaks splitting header with )
-        key = re.sub(r"\(0x[0|1]*\)", "", key)  # matches of the form (0x[0|1]*)
-        head, key = key.split(")")
+        return self._keep(numbers)
 
-        if head != "Private-Key(2048bit,2primes":
-            raise RSAParserError("File not in correct format")
+    @staticmethod
+    def _read(path: str) -> tuple[bool, dict[str, int]]:
+        """(private?, numbers) of the key in a PEM file; parsed in process,
+        see asn1"""
+
+        # will only attempt to load if file exists
+        if not os.path.exists(path):
+            raise RSAParserError(f"File not found at current path: \n{path}")
+
+        try:
+            with open(path, "rb") as f:
+                return asn1.load_pem(f.read())
+        except asn1.ASN1Error as e:
+            raise RSAParserError(f"File not in PEM key format; {e}")
+
+    def _keep(self, numbers: dict[str, int]) -> str:
+        # text of the form modulus<hex>publicExponent<decimal>privateExponent<hex>...
+        key = "".join(
+            f"{self.text_labels[label]}"
+            f"{value if label == 'e' else self._hex(value)}"
+            for label, value in numbers.items()
+        )
 
         self.key = key
+        self._loaded = key, numbers
         return key
 
+    @staticmethod
+    def _hex(value: int) -> str:
+        """Big endian hex, with a leading 00 if the top bit is set (as in DER)"""
+        return value.to_bytes(value.bit_length() // 8 + 1, "big").hex()
+
     def parse(self, keys: str | None = None) -> None:
         """Given loaded SSL info, parses and populates n, d, e, p, q"""
 
@@ -83,6 +121,11 @@ class RSAKeyLoader:
             if self.key is None:
                 raise RSAParserError("Key has not been loaded")
 
+            # numbers straight from load(); no need to go through the text
+            if self._loaded is not None and self._loaded[0] is self.key:
+                self.lookup = dict(self._loaded[1])
+                return
+
         # set up delimiters; tells us to split when parsing
         delimiters = ["n", "e", "d", "p", "q", "exp1", "exp2", "crt_coef"]
 
@@ -108,6 +151,9 @@ class RSAPublicKey:
 
     def __getattr__(self, item: str) -> int:
         """Redefine getattr so that will only give n and e"""
+        if item.startswith("__"):
+            # let copy / pickle probe for protocol methods as normal
+            raise AttributeError(item)
         if item == "n" or item == "e":
             return self.lookup[item]
         else:
@@ -142,6 +188,8 @@ class RSAKeyLoaderFromNumbers:  # type: ignore
 
 
 class RSAPrivateKey(RSAPublicKey):
+    crt_parts = ("p", "q", "exp1", "exp2", "crt_coef")
+
     def __str__(self):
         return f"n={self.n},\ne={self.e},\nd={self.d}"
 
@@ -157,11 +205,108 @@ class RSAPrivateKey(RSAPublicKey):
             exp2
             crt_coef
         """
+        if item.startswith("__") or item == "lookup":
+            raise AttributeError(item)
         if self._exists(item):
             return self.lookup[item]
         else:
             raise RSAKeyError
 
+    def has_crt(self) -> bool:
+        """True if the key has the primes etc. needed to use it through the CRT"""
+        return all(self.lookup.get(part) for part in RSAPrivateKey.crt_parts)
+
+
+class PublicKey:
+    """Immutable public key, n and e only, with the modulus' length in bytes worked out
+    up front. Plain slots, so reading n / e doesn't go through __getattr__ as with
+    RSAPublicKey; made through registry, so each key exists once"""
+
+    __slots__ = ("n", "e", "size", "__weakref__")
+
+    n: int
+    e: int
+    size: int
+
+    def __init__(self, n: int, e: int):
+        object.__setattr__(self, "n", n)
+        object.__setattr__(self, "e", e)
+        object.__setattr__(self, "size", (n.bit_length() + 7) // 8)
+
+    def __setattr__(self, name, value):
+        raise RSAPublicKeyError("Public keys can't be changed")
+
+    def __delattr__(self, name):
+        raise RSAPublicKeyError("Public keys can't be changed")
+
+    def __reduce__(self):
+        # unpickles to the shared key of the process it ends up in
+        return shared_key, (self.n, self.e)
+
+    def __eq__(self, other):
+        if not isinstance(other, (PublicKey, RSAPublicKey)):
+            return NotImplemented
+        return (self.n, self.e) == (other.n, other.e)
+
+    def __hash__(self):
+        return hash((self.n, self.e))
+
+    def __repr__(self):
+        return f"PublicKey(n={self.n:#x}, e={self.e})"
+
+    def __str__(self):
+        return f"n={self.n},\ne={self.e}\n"
+
+
+any_public_key = RSAPublicKey | PublicKey
+"""Either kind of public key; all verifying needs is n and e"""
+
+
+class KeyRegistry:
+    """Hands out one shared PublicKey per key, looked up by its (n, e), or by its id
+    in the keys table so that the DB's hex needn't even be parsed. Only holds on to
+    keys something else is still using"""
+
+    def __init__(self):
+        self._by_numbers: weakref.WeakValueDictionary[
+            tuple[int, int], PublicKey
+        ] = weakref.WeakValueDictionary()
+        self._by_id: weakref.WeakValueDictionary[
+            int, PublicKey
+        ] = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_numbers)
+
+    def get(self, n: int, e: int, *, key_id: int | None = None) -> PublicKey:
+        """Shared key for (n, e); key_id files it under its keys table id too"""
+        with self._lock:
+            if (key := self._by_numbers.get((n, e))) is None:
+                key = self._by_numbers[n, e] = PublicKey(n, e)
+            if key_id is not None:
+                self._by_id[key_id] = key
+            return key
+
+    def by_id(self, key_id: int) -> PublicKey | None:
+        """Key already handed out for a keys table id, None if there isn't one"""
+        return self._by_id.get(key_id)
+
+    def from_hex(self, key_id: int, n: str, e: str) -> PublicKey:
+        """Key of a keys table row, which holds n and e as hex"""
+        if (key := self.by_id(key_id)) is not None:
+            return key
+        return self.get(int(n, 16), int(e, 16), key_id=key_id)
+
+
+registry = KeyRegistry()
+"""Registry shared by everything that builds public keys from numbers"""
+
+
+def shared_key(n: int, e: int) -> PublicKey:
+    """registry.get, at the top level so that keys pickle by name"""
+    return registry.get(n, e)
+
 
 class TestPubKey(RSAPublicKey):
     def __init__(self, n, e):
@@ -28,34 +28,57 @@ class RSA(ABC):
 
     @staticmethod
     def check_private_key(key) -> None:
-        if type(key) == keys.RSAPublicKey:
+        if type(key) in (keys.RSAPublicKey, keys.PublicKey):
             raise DecryptionError("Cannot decrypt with a public key")
 
     @staticmethod
-    def int_to_bytes(n: int) -> bytes:
-        return int.to_bytes(n, length=n.bit_length(), byteorder=sys.byteorder).rstrip(
-            b"\x00"
-        )
+    def size(key: keys.any_public_key) -> int:
+        """Length of a key's modulus in bytes; PublicKeys have it worked out already"""
+        if isinstance(key, keys.PublicKey):
+            return key.size
+        return (key.n.bit_length() + 7) // 8
+
+    @staticmethod
+    def int_to_bytes(n: int, length: int | None = None) -> bytes:
+        """n as `length` bytes, or as few as hold it; zero bytes at the end only
+        survive if length says they're there"""
+        if length is None:
+            length = (n.bit_length() + 7) // 8
+        return n.to_bytes(length, sys.byteorder)
 
     @staticmethod
     def bytes_to_str(b: bytes) -> str:
         return b.decode("utf8").replace("\x00", "")
 
     @staticmethod
-    def encrypt(message: bytes, publicKey: keys.RSAPublicKey) -> bytes:
+    def encrypt(message: bytes, publicKey: keys.any_public_key) -> bytes:
         message = int.from_bytes(message, sys.byteorder)
         cipher = pow(message, publicKey.e, publicKey.n)
 
-        return RSA.int_to_bytes(cipher)
+        return RSA.int_to_bytes(cipher, RSA.size(publicKey))
 
     @staticmethod
-    def naive_decrypt(ciphertext: bytes, privateKey: keys.RSAPrivateKey) -> bytes:
-        # TODO: CRT decryption
+    def private_pow(c: int, key: keys.RSAPrivateKey) -> int:
+        """c^d mod n. Keys with their primes go through the CRT: c is raised mod p and
+        mod q separately, with half size exponents, and the two are put back together
+        with Garner's formula; about 3-4x faster, same result"""
+        if not key.has_crt():
+            return pow(c, key.d, key.n)
+
+        p, q = key.p, key.q
+        m_p = pow(c, key.exp1, p)
+        m_q = pow(c, key.exp2, q)
 
+        # m = m_q + q * h, where h = (m_p - m_q) / q mod p
+        h = key.crt_coef * (m_p - m_q) % p
+        return m_q + h * q
+
+    @staticmethod
+    def naive_decrypt(ciphertext: bytes, privateKey: keys.RSAPrivateKey) -> bytes:
         RSA.check_private_key(privateKey)
 
         ciphertext = int.from_bytes(ciphertext, sys.byteorder)
-        plaintext = pow(ciphertext, privateKey.d, privateKey.n)
+        plaintext = RSA.private_pow(ciphertext, privateKey)
 
         return RSA.int_to_bytes(plaintext)
 
@@ -68,17 +91,21 @@ class RSA(ABC):
         RSA.check_private_key(key)
 
         msg = int.from_bytes(msg, sys.byteorder)
-        cipher = pow(msg, key.d, key.n)  # type: ignore
+        cipher = RSA.private_pow(msg, key)
 
-        return RSA.int_to_bytes(cipher)
+        return RSA.int_to_bytes(cipher, RSA.size(key))
 
     @staticmethod
-    def inv_sig(sig: bytes | int, key: keys.RSAPublicKey) -> bytes:
+    def inv_sig(
+        sig: bytes | int, key: keys.any_public_key, length: int | None = None
+    ) -> bytes:
         """Will produce what was originally fed into sign() using public key
-        used in verifying; if verified, should generate hash of obj"""
+        used in verifying; if verified, should generate hash of obj.
+        length is how long what was signed is (e.g. a hash); without it, zero bytes
+        at its end are lost. OverflowError if it doesn't fit in length"""
         if type(sig) is bytes:
             sig: int = int.from_bytes(sig, sys.byteorder)
 
         de_sig = pow(sig, key.e, key.n)
 
-        return RSA.int_to_bytes(de_sig)
+        return RSA.int_to_bytes(de_sig, length)
@@ -1,15 +1,36 @@
 # coding=utf-8
+import logging
 import pathlib
 import sqlite3
+import threading
+from collections import OrderedDict
 
 from flask import g
 
 import src.server.models as models
+import src.transactions.ledger
 import src.transactions.transaction
+from src.crypto import cache
 from src.crypto import keys as keys
 
+logger = logging.getLogger(__name__)
+
 DATABASE = pathlib.Path(__file__).parent.parent.parent / "settle_db.sqlite"
 
+# simplified debt of the groups settled most recently, by group id; least recently
+# settled dropped past max_settlements. See Settlement
+settlements: OrderedDict[int, src.transactions.ledger.Settlement] = OrderedDict()
+max_settlements = 64
+_settlements_lock = threading.Lock()
+
+# processes to check signatures across in a request; starting a pool per request
+# thread is costly (and forking from a thread fragile), so checks stay in-process
+verify_workers = 1
+
+# held while a group is settled, so requests can't settle one group at once
+settlement_locks: dict[int, threading.Lock] = {}
+_settlement_locks_lock = threading.Lock()
+
 
 class ResourceNotFoundError(Exception):
     ...
@@ -39,30 +60,23 @@ def build_args(data_from_cursor: list | tuple) -> list:
 def build_pretty_transactions(
     src_sql: str, dest_sql: str, cursor: sqlite3.Cursor, args: list
 ) -> models.PrettyList:
-    """Returns pretty list of unchecked transactions"""
-    # TODO: add transaction verification
+    """Returns pretty list of unchecked transactions, each marked as verified or not;
+    signatures are all checked together (see transaction.verify_batch)"""
 
     if type(args) is not list:
         args = list(args)
 
-    src_transactions: list[models.PrettyTransaction] = []
-    dest_transactions: list[models.PrettyTransaction] = []
+    src_data = cursor.execute(src_sql, args).fetchall()
+    src_transactions = [
+        models.PrettyTransaction(*build_args(row), False) for row in src_data
+    ]
 
-    src_data = cursor.execute(src_sql, args)
+    dest_data = cursor.execute(dest_sql, args).fetchall()
+    dest_transactions = [
+        models.PrettyTransaction(*build_args(row), False) for row in dest_data
+    ]
 
-    for row in src_data.fetchall():
-        pretty = models.PrettyTransaction(*build_args(row), False)
-        print(f"Checking id {pretty.id}")
-        verify_pretty(pretty, cursor)
-        src_transactions.append(pretty)
-
-    dest_data = cursor.execute(dest_sql, args)
-
-    for row in dest_data.fetchall():
-        pretty = models.PrettyTransaction(*build_args(row), False)
-        print(f"Checking id {pretty.id}")
-        verify_pretty(pretty, cursor)
-        dest_transactions.append(pretty)
+    verify_pretties(src_transactions + dest_transactions, cursor)
 
     return models.PrettyList(src_transactions, dest_transactions)
 
@@ -73,7 +87,7 @@ def get_verified_transaction_by_id(
     """Gets transaction object from id
     raises ResourceNotFoundError if nothing is returned"""
 
-    sql = """SELECT src_id, dest_id, k.n, k.e, k2.n, k2.e, amount, transactions.id, reference, time_of_creation, src_sig, dest_sig, g.id FROM transactions
+    sql = """SELECT src_id, dest_id, k.n, k.e, k2.n, k2.e, amount, transactions.id, reference, time_of_creation, src_sig, dest_sig, g.id, k.id, k2.id FROM transactions
 JOIN keys k on transactions.src_key = k.id
 JOIN keys k2 on transactions.dest_key = k2.id
 JOIN pairs p on transactions.pair_id = p.id
@@ -88,8 +102,9 @@ WHERE transactions.id = ?;
     else:
         src_key_data = raw_transaction_data[2:4]
         dest_key_data = raw_transaction_data[4:6]
+        src_key_id, dest_key_id = raw_transaction_data[13:15]
         transaction_data = list(raw_transaction_data[:2]) + list(
-            raw_transaction_data[6:]
+            raw_transaction_data[6:13]
         )
 
         (
@@ -104,31 +119,23 @@ WHERE transactions.id = ?;
             group,
         ) = transaction_data
 
-        print(
-            f"amount: {amount}\n"
-            f"tran id: {t_id}\n"
-            f"ref: {ref}\n"
-            f"time: {time}\n"
-            f"src_sig: {src_sig}\n"
-            f"dest_sig: {dest_sig}\n"
-            f"group: {group}\n"
+        logger.debug(
+            "transaction %s: amount %s, ref %s, time %s, group %s",
+            t_id,
+            amount,
+            ref,
+            time,
+            group,
         )
 
-        # build keys
-        # convert hex -> ints
-        src_key_data = map(lambda x: int(x, 16), src_key_data)
-        dest_key_data = map(lambda x: int(x, 16), dest_key_data)
-
-        # load to key loaders
-        src_ldr = keys.RSAKeyLoaderFromNumbers()
-        dest_ldr = keys.RSAKeyLoaderFromNumbers()
-
-        src_ldr.load(*src_key_data)  # type: ignore
-        dest_ldr.load(*dest_key_data)
+        # build keys; shared between every transaction using them, and only
+        # parsed from hex the first time a key is seen
+        src_key = keys.registry.from_hex(src_key_id, *src_key_data)
+        dest_key = keys.registry.from_hex(dest_key_id, *dest_key_data)
 
         # add keys to transaction data in the right place so that they can be unpacked as positional arguments
-        transaction_data.insert(3, dest_ldr.pub_key())
-        transaction_data.insert(3, src_ldr.pub_key())
+        transaction_data.insert(3, dest_key)
+        transaction_data.insert(3, src_key)
 
         # build signatures dict for transaction
 
@@ -148,6 +155,38 @@ WHERE transactions.id = ?;
         return src.transactions.transaction.Transaction(*transaction_data)
 
 
+def settlement_lock(gid: int) -> threading.Lock:
+    """Returns the lock to hold while settling a group, or touching its settlement"""
+    with _settlement_locks_lock:
+        return settlement_locks.setdefault(gid, threading.Lock())
+
+
+def take_settlement(gid: int, open_ids: set[int]) -> src.transactions.ledger.Settlement:
+    """Takes the group's settlement state out of settlements, starting afresh if any
+    transaction it accounts for has since been settled or removed; hold
+    settlement_lock(gid), and put it back with keep_settlement once the db agrees"""
+    with _settlements_lock:
+        settlement = settlements.pop(gid, None)
+
+    if settlement is None or not settlement.accounts_for() <= open_ids:
+        settlement = src.transactions.ledger.Settlement()
+
+    return settlement
+
+
+def keep_settlement(gid: int, settlement: src.transactions.ledger.Settlement) -> None:
+    """Keeps the group's settlement state for its next settle; nothing is kept for a
+    group with nothing open"""
+    if not settlement.accounts_for():
+        return
+
+    with _settlements_lock:
+        settlements[gid] = settlement
+        settlements.move_to_end(gid)
+        while len(settlements) > max_settlements:
+            settlements.popitem(last=False)
+
+
 def user_exists(email: str, cursor: sqlite3.Cursor) -> bool:
     return not not cursor.execute(
         """SELECT COUNT(*) FROM users WHERE email = ?""", [email]
@@ -173,17 +212,38 @@ def transaction_to_pretty(emails, transaction, verified):
     return pretty
 
 
+def verify_pretties(
+    pretties: list[models.PrettyTransaction], cursor: sqlite3.Cursor
+) -> list[models.PrettyTransaction]:
+    """Marks each of pretties as verified or not; signatures are all checked
+    together (see transaction.verify_batch)"""
+    results = src.transactions.transaction.verify_batch(
+        [get_verified_transaction_by_id(pretty.id, cursor) for pretty in pretties],
+        workers=verify_workers,
+    )
+
+    for pretty, verified in zip(pretties, results):
+        pretty.verified = verified
+        if not verified:
+            logger.warning("signature of %s invalid", pretty.id)
+
+    logger.debug("verification cache: %s", cache.verifications.info())
+
+    return pretties
+
+
 def verify_pretty(
     pretty: models.PrettyTransaction, cursor: sqlite3.Cursor
 ) -> models.PrettyTransaction:
-    """Update the verification status of pretty depending on signatures"""
+    """Update the verification status of pretty depending on signatures;
+    signatures already checked come out of cache.verifications, with no RSA done"""
     try:
         t = get_verified_transaction_by_id(pretty.id, cursor)
         t.verify()
         pretty.verified = True
     except src.transactions.transaction.VerificationError:
         pretty.verified = False
-        print(f"Signature of {pretty.id} invalid")
+        logger.warning("signature of %s invalid", pretty.id)
 
     return pretty
 
@@ -191,6 +251,7 @@ def verify_pretty(
 def push_transaction(
     transaction: src.transactions.transaction.Transaction, cursor: sqlite3.Cursor
 ):
+    """Inserts transaction, unsigned, into the db; returns its ID"""
 
     # check pair exists; append if not
     pair_id: int = cursor.execute(
@@ -224,10 +285,8 @@ def push_transaction(
     (pair_id, group_id, amount, src_key, dest_key, reference, time_of_creation) 
             VALUES (?, ?, ?, ?, ?, ?, ?)"""
 
-    print(key_ids[0][0], key_ids[1][0])
-
     # append unsigned transactions
-    cursor.execute(
+    inserted = cursor.execute(
         sql,
         [
             pair_id,
@@ -241,3 +300,5 @@ def push_transaction(
     )
 
     get_db().commit()
+
+    return inserted.lastrowid
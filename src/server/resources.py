@@ -347,6 +347,16 @@ class Simplifier(Resource):
     def post(self, gid: int):
         """Actually settle the group, return ledger schema, 201 if succeeded"""
 
+        # how to settle; see Simplify.settle
+        mode = request.args.get("mode", "max_flow")
+        if mode not in ledgers.Simplify.modes:
+            return f"Unknown settling mode {mode}", 400
+
+        # one settle of a group at a time; max_flow keeps state between them
+        with processes.settlement_lock(gid):
+            return self.settle(gid, mode)
+
+    def settle(self, gid: int, mode: str):
         cursor = processes.get_db()
 
         # build full transactions of group
@@ -360,25 +370,54 @@ class Simplifier(Resource):
             [gid],
         ).fetchall()
 
-        unfiltered_transactions: list[transactions.Transaction] = []
-        for id in ids:
-            unfiltered_transactions.append(processes.get_verified_transaction_by_id(*id, cursor))  # type: ignore
+        if mode == "max_flow":
+            # absorb only what's new since the group was last settled; the state is
+            # only kept again once the db agrees with it
+            settlement = processes.take_settlement(gid, {ID for (ID,) in ids})
+            try:
+                settlement.absorb_all(
+                    (
+                        processes.get_verified_transaction_by_id(ID, cursor)  # type: ignore
+                        for (ID,) in ids
+                        if ID not in settlement.absorbed
+                    ),
+                    workers=processes.verify_workers,
+                )
+                new_transactions = settlement.settle()
+            except ledgers.NoFutherSimplifications:
+                # nothing was written, so it still stands for what's open
+                processes.keep_settlement(gid, settlement)
+                return (
+                    "No changes made to debt structure - heuristic did not find anywhere to simplify",
+                    202,
+                )
+            except ledgers.VerificationError:
+                # absorb_all takes in all of them or none
+                processes.keep_settlement(gid, settlement)
+                return "Couldn't simplify group - unverified transactions in group", 403
 
-        # build ledger
-        ledger = ledgers.Ledger()
-        for transaction in unfiltered_transactions:
-            ledger.append(transaction)
-
-        # simplify debt system
-        try:
-            ledger.simplify_ledger()
-        except ledgers.NoFutherSimplifications:
-            return (
-                "No changes made to debt structure - heuristic did not find anywhere to simplify",
-                202,
-            )
-        except ledgers.VerificationError:
-            return "Couldn't simplify group - unverified transactions in group", 403
+        else:
+            # build ledger, a transaction at a time; none are kept once folded in
+            try:
+                ledger = ledgers.StreamingLedger.from_stream(
+                    processes.get_verified_transaction_by_id(ID, cursor)  # type: ignore
+                    for (ID,) in ids
+                )
+            except ledgers.VerificationError:
+                return "Couldn't simplify group - unverified transactions in group", 403
+
+            # simplify debt system
+            try:
+                ledger.simplify_ledger(mode=mode, workers=processes.verify_workers)
+            except ledgers.NoFutherSimplifications:
+                return (
+                    "No changes made to debt structure - heuristic did not find anywhere to simplify",
+                    202,
+                )
+            except ledgers.VerificationError:
+                return "Couldn't simplify group - unverified transactions in group", 403
+
+            new_transactions = ledger.ledger
 
         # mark old transactions as settled
 
@@ -392,9 +431,16 @@ class Simplifier(Resource):
         )
 
         # push transactions to db
-        for transaction in ledger.ledger:
+        pushed: set[int] = set()
+        for transaction in new_transactions:
             transaction.group = gid
-            processes.push_transaction(transaction, cursor)
+            pushed.add(processes.push_transaction(transaction, cursor))
+
+        # the settled graph now stands for the pushed transactions, which are
+        # only trusted once signed; see Settlement.absorb
+        if mode == "max_flow":
+            settlement.pushed(pushed)
+            processes.keep_settlement(gid, settlement)
 
         return "success", 201
 
@@ -420,10 +466,9 @@ class GroupDebt(Resource):
             src = row.pop()
             row.append(f"{src} -> {dest}")
 
-            pretty = models.PrettyTransaction(*processes.build_args(row), False)
-            pretty = processes.verify_pretty(pretty, cursor)
+            trns.append(models.PrettyTransaction(*processes.build_args(row), False))
 
-            trns.append(pretty)
+        processes.verify_pretties(trns, cursor)
 
         schema = schemas.PrettyListSchema()
         return schema.dump(models.PrettyList(trns, [])), 200
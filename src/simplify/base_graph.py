@@ -5,6 +5,7 @@ Set up graph object to be used in condensing debt settling
 """
 
 import copy
+from typing import Generic, Iterator, Protocol, TypeVar
 
 import graphviz
 
@@ -15,12 +16,27 @@ class GraphError(Exception):
     ...
 
 
+class AnyEdge(Protocol):
+    """What a graph needs of its edges"""
+
+    @property
+    def node(self) -> Vertex:
+        ...
+
+    def to_dot(self):
+        ...
+
+
+E = TypeVar("E", bound=AnyEdge)
+"""Type of edge a graph holds"""
+
+
 class Default:
     def __gt__(self, other):
         return True
 
 
-class GenericDigraph:
+class GenericDigraph(Generic[E]):
     def __init__(self, vertices: list[Vertex]) -> None:
         """
         Sets up a graph given a list of vertices
@@ -28,23 +44,26 @@ class GenericDigraph:
         # initialise with values being empty
         # build dict checking each type as we go
 
-        self.graph: dict[Vertex, list[Edge]] = {
+        self.graph: dict[Vertex, list[E]] = {
             vertex: [] if self.sanitize(vertex) else None  # type: ignore
             for vertex in vertices
         }
 
-        self._backwards_graph: dict[Vertex, list[Edge]] = copy.deepcopy(self.graph)
+        self._backwards_graph: dict[Vertex, list[E]] = {
+            vertex: [] for vertex in self.graph
+        }
+
+        # target -> edge for each vertex, kept alongside the adjacency lists
+        self._edges: dict[Vertex, dict[Vertex, E]] = {
+            vertex: {} for vertex in self.graph
+        }
 
     def __str__(self):
         """Pretty print graph"""
-        out = ""
-        for node, adj_list in self.graph.items():
-            pretty_nodes = ""
-            for edge in adj_list:
-                pretty_nodes += f"{str(edge).upper()}"
-            out += f"{str(node).upper()} -> {pretty_nodes}\n"
-
-        return out
+        return "".join(
+            f"{str(node).upper()} -> {''.join(str(e).upper() for e in adj_list)}\n"
+            for node, adj_list in self.graph.items()
+        )
 
     def __len__(self):
         return len(self.graph)
@@ -55,25 +74,88 @@ class GenericDigraph:
     def __eq__(self, other):
         return self.graph == other
 
-    def to_dot(self, *, n: int = 0, title="graph"):
-        """prints dot representation of graph"""
-        dot_source = ""
+    def dot_lines(self) -> Iterator[str]:
+        """Body of the graph's dot source, a line at a time"""
         for src, adj_list in self.graph.items():
             for edge in adj_list:
-                dot_source += f"{str(src)} -> {str(edge.node)} {edge.to_dot()}\n"
+                yield f"{str(src)} -> {str(edge.node)} {edge.to_dot()}\n"
             if not adj_list:
-                dot_source += f"{src}\n"
+                yield f"{src}\n"
+
+    def write_dot(self, path: str) -> None:
+        """Streams dot source to a file, without building it up as one string"""
+        with open(path, "w") as dot_file:
+            dot_file.write("digraph { ")
+            dot_file.writelines(self.dot_lines())
+            dot_file.write(" }")
 
-        dot = graphviz.Source(f"digraph {{ {dot_source} }}")
+    def to_dot(self, *, n: int = 0, title="graph"):
+        """prints dot representation of graph; renders there and then, so for
+        rendering while settling see render.RenderQueue"""
+        dot = graphviz.Source(f"digraph {{ {''.join(self.dot_lines())} }}")
         dot.format = "svg"
         dot.render(f"./graph_renders/{title}{n}")
 
+    def clone(self):
+        """Copy of the graph that can be changed without touching this one;
+        edges are copied one level deep, vertices (immutable) are shared"""
+        clone = copy.copy(self)
+        clone.graph = {
+            node: [copy.copy(edge) for edge in adj_list]
+            for node, adj_list in self.graph.items()
+        }
+        clone._backwards_graph = {
+            node: [copy.copy(edge) for edge in adj_list]
+            for node, adj_list in self._backwards_graph.items()
+        }
+        clone._reindex()
+        return clone
+
+    def _reindex(self) -> None:
+        """Rebuilds the target -> edge index from the adjacency lists"""
+        # reversed, so the first of any parallel edges wins, as with edge_from_nodes
+        self._edges = {
+            node: {edge.node: edge for edge in reversed(adj_list)}
+            for node, adj_list in self.graph.items()
+        }
+
+    def _link(self, s: Vertex, edge: E) -> None:
+        """Appends edge to s's adjacency list and index"""
+        self.graph[s].append(edge)
+        self._edges[s].setdefault(edge.node, edge)
+
+    def _unlink(self, s: Vertex, edge: E) -> None:
+        """Removes that exact edge from s's adjacency list and index"""
+        adj_list = self.graph[s]
+        for n, other in enumerate(adj_list):
+            if other is edge:
+                del adj_list[n]
+                break
+
+        index = self._edges[s]
+        if index.get(edge.node) is edge:
+            del index[edge.node]
+            # fall back on any parallel edge still there
+            for other in adj_list:
+                if other.node == edge.node:
+                    index[edge.node] = other
+                    break
+
+    def edge_to(self, s: Vertex, t: Vertex) -> E:
+        """Edge s -> t, looked up in the index; same as edge_from_nodes(t, self[s])"""
+        try:
+            return self._edges[s][t]
+        except KeyError:
+            if s not in self._edges:
+                raise
+            raise GraphError("Node not in list")
+
     def nodes(self) -> list[Vertex]:
         """Returns nodes in the graph"""
         return list(self.graph.keys())
 
     @staticmethod
-    def edge_from_nodes(node: Vertex, list_: list[Edge]) -> Edge:
+    def edge_from_nodes(node: Vertex, list_: list[E]) -> E:
         """Checks if node is in a list of edges, will return relevant edge if found
         usage:"""
         for edge in list_:
@@ -85,7 +167,7 @@ class GenericDigraph:
         raise GraphError("Node not in list")
 
     @staticmethod
-    def nodes_from_edges(edges: list[Edge]) -> list[Vertex]:
+    def nodes_from_edges(edges: list[E]) -> list[Vertex]:
         nodes = []
         for edge in edges:
             nodes.append(edge.node)
@@ -110,8 +192,9 @@ class GenericDigraph:
     def add_node(self, v: Vertex) -> None:
         self.graph[v] = []
         self._backwards_graph[v] = []
+        self._edges[v] = {}
 
-    def pop_node(self, v: Vertex) -> dict[Vertex, list[Edge]]:
+    def pop_node(self, v: Vertex) -> dict[Vertex, list[E]]:
         """Pops node, returns key/value pair of node and previous connections"""
         # look at _backwards_graph to find associations
         for edge in self._backwards_graph[v]:
@@ -119,30 +202,27 @@ class GenericDigraph:
             pointing_node_neighbours = self._backwards_graph[
                 edge.node
             ]  # [Edge(A), Edge(C)]
-            pointing_edge = self.edge_from_nodes(v, self.graph[edge.node])
-            self.graph[edge.node].remove(pointing_edge)  # type: ignore
+            pointing_edge = self.edge_to(edge.node, v)
+            self._unlink(edge.node, pointing_edge)
 
+        self._edges.pop(v)
         return {v: self.graph.pop(v)}
 
     def is_edge(self, s: Vertex, t: Vertex) -> int:
         """Checks for an edge between nodes (directional: s->t !=> t->s)"""
-        try:
-            self.edge_from_nodes(t, self.graph[s])
-            return 1
-        except GraphError:
-            return 0
+        return 1 if t in self._edges[s] else 0
 
-    def pop_edge(self, s: Vertex, t: Vertex) -> Edge:
+    def pop_edge(self, s: Vertex, t: Vertex) -> E:
         self.sanitize(s, t)
-        edge = self.edge_from_nodes(t, self.graph[s])
+        edge = self.edge_to(s, t)
 
         if edge is None:
             raise GraphError("Cannot pop edge that doesnt exist")
 
-        self.graph[s].remove(edge)
+        self._unlink(s, edge)
         return edge
 
-    def neighbours(self, node: Vertex) -> list[Edge]:
+    def neighbours(self, node: Vertex) -> list[E]:
         self.sanitize(node)
         return self[node]
 
@@ -153,9 +233,9 @@ class GenericDigraph:
         return True if forwards or backwards else False
 
 
-class Digraph(GenericDigraph):
+class Digraph(GenericDigraph[Edge]):
     def add_edge(self, s: Vertex, *args: Vertex) -> None:
         self.sanitize(s, *args)
         for target in args:
-            self.graph[s].append(Edge(target))
+            self._link(s, Edge(target))
             self._backwards_graph[target].append(Edge(s))
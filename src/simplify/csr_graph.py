@@ -0,0 +1,679 @@
+# coding=utf-8
+
+"""
+Flow graph stored as flat arrays (compressed sparse rows) instead of
+dicts of FlowEdge objects. Vertices are mapped to dense integer IDs; the arcs
+leaving vertex u sit next to each other, in slots `_start[u]:_start[u] + _used[u]`
+of the arrays, and `_reverse[arc]` is the arc going the other way between the
+same two nodes (its residual twin).
+
+Max flow and simplify_debt's loop run straight on the arrays (max_flow,
+simplify_into); the rest of the FlowGraph surface is there for everything else,
+handing out CSREdge views
+"""
+
+import time
+from array import array
+
+from src.simplify import stats
+from src.simplify.base_graph import GraphError
+from src.simplify.flow_graph import FlowGraph, FlowEdge, edge_stream, replay
+from src.simplify.graph_objects import Vertex
+
+
+class CSREdge(FlowEdge):
+    """View onto one arc of a CSRFlowGraph; behaves like a FlowEdge, but reads and
+    writes go straight to the graph's arrays.
+
+    Views are made when asked for and not kept. Adding an edge between two nodes
+    that weren't connected can move arcs around, after which views made before
+    then raise GraphError rather than read the wrong arc"""
+
+    __slots__ = ("_graph", "_arc", "_layout")
+
+    def __init__(self, graph: "CSRFlowGraph", arc: int):
+        self._graph = graph
+        self._arc = arc
+        self._layout = graph._layout
+
+    @property
+    def arc(self) -> int:
+        if self._layout != self._graph._layout:
+            raise GraphError("Edge is out of date; the graph's arcs have moved")
+        return self._arc
+
+    @property
+    def src(self) -> Vertex:  # type: ignore
+        graph = self._graph
+        return graph._vertices[graph._targets[graph._reverse[self.arc]]]
+
+    @property
+    def node(self) -> Vertex:  # type: ignore
+        return self._graph._vertices[self._graph._targets[self.arc]]
+
+    @property
+    def capacity(self) -> int:  # type: ignore
+        return self._graph._capacity[self.arc]
+
+    @capacity.setter
+    def capacity(self, value: int) -> None:
+        self._graph._capacity[self.arc] = value
+
+    @property
+    def flow(self) -> int:  # type: ignore
+        return self._graph._flow[self.arc]
+
+    @flow.setter
+    def flow(self, value: int) -> None:
+        self._graph._flow[self.arc] = value
+
+    @property
+    def residual(self) -> bool:  # type: ignore
+        return bool(self._graph._residual[self.arc])
+
+    def unused_capacity(self):
+        arc = self.arc
+        return self._graph._capacity[arc] - self._graph._flow[arc]
+
+
+class CSRFlowGraph(FlowGraph):
+    """FlowGraph with capacities, flows and residual pairing held in arrays.
+
+    Exposes the same surface as FlowGraph (get_edge, is_edge, add_edge, pop_edge,
+    flow_neighbours, adjust_edges), so MaxFlow and Simplify run on it unchanged;
+    MaxFlow.edmonds_karp and Simplify.simplify_debt hand over to max_flow and
+    simplify_into, which don't make an object per edge.
+
+    Edges are found by scanning their row, so there is no index to keep up.
+    Popping an edge leaves a dead slot behind, keeping the order of the rest.
+    Each row has slots to spare for new edges; a full row is moved to the end of
+    the arrays with twice the room, so adding edges never rebuilds the graph"""
+
+    def __init__(self, vertices: list[Vertex]):
+        # adjacency lives in arrays, so GenericDigraph's dicts are never built
+        for vertex in vertices:
+            self.sanitize(vertex)
+
+        self._vertices: list[Vertex] = list(vertices)
+        self._ids: dict[Vertex, int] = {
+            vertex: ID for ID, vertex in enumerate(self._vertices)
+        }
+
+        self.net_debt: dict[Vertex, int] = {node: 0 for node in self._vertices}
+
+        # each vertex's row: first slot, slots used (dead arcs included), slots held
+        self._start = array("l", [0]) * len(self._vertices)
+        self._used = array("l", [0]) * len(self._vertices)
+        self._reserved = array("l", [0]) * len(self._vertices)
+
+        # one entry per arc
+        self._targets = array("l")
+        self._capacity = array("q")
+        self._flow = array("q")
+        self._reverse = array("l")
+        self._residual = bytearray()
+        self._live = bytearray()
+
+        # live real edges, each of which has a residual twin
+        self._pairs = 0
+        # bumped whenever arcs move, so CSREdge views can tell they are out of date
+        self._layout = 0
+        # arcs max_flow has pushed flow down since the last adjust
+        self._touched: list[int] = []
+
+    @classmethod
+    def from_graph(cls, graph: FlowGraph) -> "CSRFlowGraph":
+        """Packs a FlowGraph into arrays, keeping edge order, flows and net debts"""
+        csr = cls(graph.nodes())
+        rows = [graph[node] for node in csr._vertices]
+
+        # slot each edge goes in, to pair it up with its twin
+        slots: dict[int, int] = {}
+        for u, row in enumerate(rows):
+            csr._start[u] = len(slots)
+            csr._used[u] = csr._reserved[u] = len(row)
+            for edge in row:
+                slots[id(edge)] = len(slots)
+
+        edges = [edge for row in rows for edge in row]
+        csr._targets = array("l", [csr._ids[edge.node] for edge in edges])
+        csr._capacity = array("q", [edge.capacity for edge in edges])
+        csr._flow = array("q", [edge.flow for edge in edges])
+        csr._reverse = array(
+            "l", [slots[id(graph.get_edge(edge.node, edge.src))] for edge in edges]
+        )
+        csr._residual = bytearray(edge.residual for edge in edges)
+        csr._live = bytearray(b"\x01") * len(edges)
+
+        csr._pairs = sum(not edge.residual for edge in edges)
+        csr.net_debt = dict(graph.net_debt)
+
+        return csr
+
+    @classmethod
+    def from_edges(  # type: ignore
+        cls, edges: edge_stream, nodes: list[Vertex] | None = None
+    ) -> "CSRFlowGraph":
+        """Builds from a stream of (src, dest, amount) straight into arrays;
+        see FlowGraph.from_edges"""
+        adj, net_debt = replay(edges, nodes)
+
+        csr = cls(list(adj))
+        csr.net_debt.update(net_debt)
+        ids = csr._ids
+
+        # slot each arc goes in, by its ends, to pair it up with its twin
+        slots: dict[tuple[int, int], int] = {}
+        for u, row in enumerate(adj.values()):
+            csr._start[u] = len(slots)
+            csr._used[u] = csr._reserved[u] = len(row)
+            for dest, _ in row:
+                slots[u, ids[dest]] = len(slots)
+
+        arcs = [arc for row in adj.values() for arc in row]
+        csr._targets = array("l", [ids[dest] for dest, _ in arcs])
+        csr._capacity = array("q", [capacity for _, capacity in arcs])
+        csr._flow = array("q", [0]) * len(arcs)
+        csr._reverse = array("l", [slots[v, u] for u, v in slots])
+        csr._residual = bytearray(not capacity for _, capacity in arcs)
+        csr._live = bytearray(b"\x01") * len(arcs)
+
+        csr._pairs = len(arcs) // 2
+
+        return csr
+
+    def to_graph(self) -> FlowGraph:
+        """Unpacks into a FlowGraph, keeping edge order, flows and net debts"""
+        graph = FlowGraph(self._vertices)
+        for u, node in enumerate(self._vertices):
+            for arc in self._row(u):
+                if self._live[arc]:
+                    edge = FlowEdge(
+                        node,
+                        self._vertices[self._targets[arc]],
+                        self._capacity[arc],
+                        self._flow[arc],
+                    )
+                    edge.residual = bool(self._residual[arc])
+                    graph._link(node, edge)
+        graph.net_debt = dict(self.net_debt)
+        return graph
+
+    def clone(self) -> "CSRFlowGraph":
+        """Copy of the graph made by copying its flat arrays; no per edge objects"""
+        clone = CSRFlowGraph.__new__(CSRFlowGraph)
+        clone.__dict__.update(self.__dict__)
+        for name in (
+            "_vertices",
+            "_start",
+            "_used",
+            "_reserved",
+            "_targets",
+            "_capacity",
+            "_flow",
+            "_reverse",
+            "_residual",
+            "_live",
+            "_touched",
+        ):
+            setattr(clone, name, getattr(self, name)[:])
+        clone._ids = dict(self._ids)
+        clone.net_debt = dict(self.net_debt)
+        return clone
+
+    def _row(self, u: int) -> range:
+        """Slots of u's row; dead arcs included"""
+        start = self._start[u]
+        return range(start, start + self._used[u])
+
+    def _find(self, u: int, v: int) -> int | None:
+        """Live arc u -> v, None if there isn't one"""
+        targets, live = self._targets, self._live
+        for arc in self._row(u):
+            if targets[arc] == v and live[arc]:
+                return arc
+        return None
+
+    def _kill(self, arc: int) -> None:
+        """Marks an edge and its twin as deleted; they keep their slots, so other
+        arcs don't move"""
+        for dead in arc, self._reverse[arc]:
+            self._live[dead] = 0
+            self._capacity[dead] = 0
+            self._flow[dead] = 0
+        self._pairs -= 1
+
+    def _move(self, moves: dict[int, int]) -> None:
+        """Copies arcs to new slots (old: new), pointing their twins at them"""
+        columns = (self._targets, self._capacity, self._flow, self._residual)
+
+        # read everything first; sorting a row moves arcs into each other's slots
+        arcs = [
+            (new, [column[old] for column in columns], self._reverse[old])
+            for old, new in moves.items()
+        ]
+        for old in moves:
+            self._live[old] = 0
+
+        for new, values, twin in arcs:
+            for column, value in zip(columns, values):
+                column[new] = value
+            self._live[new] = 1
+
+            twin = moves.get(twin, twin)
+            self._reverse[new] = twin
+            self._reverse[twin] = new
+
+        self._layout += 1
+
+    def _make_room(self, u: int, n: int) -> None:
+        """Makes sure u's row has room for n more arcs; if not, it is moved to the
+        end of the arrays with room to spare, leaving its dead arcs behind"""
+        if self._reserved[u] - self._used[u] >= n:
+            return
+
+        arcs = [arc for arc in self._row(u) if self._live[arc]]
+        size = max(4, 2 * (len(arcs) + n))
+        start = len(self._targets)
+
+        for name in ("_targets", "_capacity", "_flow", "_reverse"):
+            column: array = getattr(self, name)
+            column.frombytes(bytes(size * column.itemsize))
+        self._residual.extend(bytes(size))
+        self._live.extend(bytes(size))
+
+        self._start[u] = start
+        self._used[u] = len(arcs)
+        self._reserved[u] = size
+        if arcs:
+            self._move({arc: start + n for n, arc in enumerate(arcs)})
+
+    def _append(self, u: int, v: int, capacity: int, residual: bool) -> int:
+        """Puts a new arc u -> v at the end of u's row; there has to be room"""
+        arc = self._start[u] + self._used[u]
+        self._used[u] += 1
+
+        self._targets[arc] = v
+        self._capacity[arc] = capacity
+        self._flow[arc] = 0
+        self._residual[arc] = residual
+        self._live[arc] = 1
+        return arc
+
+    def _sort(self, u: int) -> None:
+        """Sorts u's row by capacity, biggest first (stable), as FlowGraph.add_edge
+        does to its adjacency lists; dead arcs are dropped from the row"""
+        arcs = [arc for arc in self._row(u) if self._live[arc]]
+        arcs.sort(key=self._capacity.__getitem__, reverse=True)
+
+        start = self._start[u]
+        moves = {arc: start + n for n, arc in enumerate(arcs) if arc != start + n}
+        self._used[u] = len(arcs)
+        if moves:
+            self._move(moves)
+
+    def __getitem__(self, item: Vertex) -> list[CSREdge]:  # type: ignore
+        row = self._row(self._ids[item])
+        return [CSREdge(self, arc) for arc in row if self._live[arc]]
+
+    def __len__(self):
+        return len(self._vertices)
+
+    def __bool__(self):
+        """Returns true if not empty"""
+        return self._pairs > 0
+
+    @property
+    def graph(self) -> dict[Vertex, list[CSREdge]]:  # type: ignore
+        """Adjacency lists of views, for code that walks graph.graph"""
+        return {node: self[node] for node in self._vertices}
+
+    def fingerprint(self) -> frozenset[tuple[Vertex, Vertex, int]]:
+        # straight from the arrays; no views needed
+        vertices, targets = self._vertices, self._targets
+        return frozenset(
+            (node, vertices[targets[arc]], self._capacity[arc])
+            for u, node in enumerate(vertices)
+            for arc in self._row(u)
+            if self._live[arc] and not self._residual[arc]
+        )
+
+    def balances(self) -> list[int]:
+        """Net debts of nodes() (in that order), summed from the real arcs; an arc's
+        source is where its twin points"""
+        owed = [0] * len(self._vertices)
+        targets, reverse, capacity = self._targets, self._reverse, self._capacity
+
+        for arc, dest in enumerate(targets):
+            if self._live[arc] and not self._residual[arc]:
+                owed[targets[reverse[arc]]] += capacity[arc]
+                owed[dest] -= capacity[arc]
+
+        return owed
+
+    def nodes(self) -> list[Vertex]:
+        return list(self._vertices)
+
+    def is_node(self, v: Vertex) -> bool:
+        return v in self._ids
+
+    def add_node(self, v: Vertex) -> None:
+        self.sanitize(v)
+        self._ids[v] = len(self._vertices)
+        self._vertices.append(v)
+        self._start.append(len(self._targets))
+        self._used.append(0)
+        self._reserved.append(0)
+        self.net_debt[v] = 0
+
+    def pop_node(self, v: Vertex):
+        raise GraphError("Cannot pop nodes from a CSRFlowGraph")
+
+    def connected(self, node: Vertex) -> bool:
+        # every edge puts an arc (real or residual) in both of its nodes' rows
+        return any(self._live[arc] for arc in self._row(self._ids[node]))
+
+    def get_edge(self, src: Vertex, dest: Vertex) -> CSREdge:
+        """Gets edge in graph between two nodes, residual edges included"""
+        self.sanitize(src, dest)
+
+        if (arc := self._find(self._ids[src], self._ids[dest])) is None:
+            raise GraphError("Node not in list")
+
+        return CSREdge(self, arc)
+
+    def is_edge(self, s: Vertex, t: Vertex, *, residual=False) -> bool:
+        """Checks for edge in a graph; residual = True allows broadening to include residual edges"""
+        if (arc := self._find(self._ids[s], self._ids[t])) is None:
+            return False
+        return residual or not self._residual[arc]
+
+    def add_edge(self, src: Vertex, *edges: tuple[Vertex, int], update_debt=True):
+        """Add an edge and its residual counterpart; same rules as FlowGraph.add_edge"""
+        for dest, capacity in edges:
+            self.sanitize(src, dest)
+            s, d = self._ids[src], self._ids[dest]
+
+            fwd = self._find(s, d)
+
+            # no existing edge between two nodes
+            if fwd is None:
+                self._make_room(s, 2 if s == d else 1)
+                self._make_room(d, 1)
+
+                arc = self._append(s, d, capacity, False)
+                twin = self._append(d, s, 0, True)
+                self._reverse[arc], self._reverse[twin] = twin, arc
+                self._pairs += 1
+
+                self._sort(s)
+
+            # edge going in direction of edge being added
+            elif not self._residual[fwd]:
+                self._capacity[fwd] += capacity
+
+            # otherwise there's a real edge going the other way
+            else:
+                back = self._reverse[fwd]
+                new_cap = self._capacity[back] - capacity
+
+                if new_cap > 0:
+                    self._capacity[back] = new_cap
+                else:
+                    self._kill(back)
+                    if new_cap < 0:
+                        # debt for the whole amount is handled below
+                        self.add_edge(src, (dest, -new_cap), update_debt=False)
+
+            if update_debt:
+                # handle net_debt;
+                self.net_debt[src] += capacity
+                self.net_debt[dest] -= capacity
+
+    def pop_edge(self, src: Vertex, dest: Vertex, *, update_debt=False):
+        """removes REAL edges, and deletes residual counterpart"""
+        if (fwd := self._find(self._ids[src], self._ids[dest])) is None:
+            raise GraphError("Node not in list")
+
+        capacity = self._capacity[fwd]
+        self._kill(fwd)
+
+        if update_debt:
+            # handle net_debt;
+            self.net_debt[src] -= capacity
+            self.net_debt[dest] += capacity
+
+    def adjust_edges(self):
+        """Run edge adjust on each arc; real arcs left with no capacity are deleted
+        along with their residual counterpart"""
+        self._adjust(
+            arc
+            for u in range(len(self._vertices))
+            for arc in self._row(u)
+            if self._live[arc] and not self._residual[arc]
+        )
+        self._touched.clear()
+
+    def _adjust(self, arcs) -> None:
+        """adjust_edges for just the given arcs; either half of a pair will do"""
+        capacity, flow, reverse, residual, live = (
+            self._capacity,
+            self._flow,
+            self._reverse,
+            self._residual,
+            self._live,
+        )
+        record = stats.active()
+
+        for arc in arcs:
+            if residual[arc]:
+                arc = reverse[arc]
+            if not live[arc] or not flow[arc]:
+                continue
+
+            if record is not None:
+                record.edges_adjusted += 1
+
+            if unused := capacity[arc] - flow[arc]:
+                capacity[arc] = unused
+                flow[arc] = 0
+                flow[reverse[arc]] = 0
+            else:
+                self._kill(arc)
+
+    def max_flow(self, src: Vertex, sink: Vertex) -> int:
+        """Edmonds-Karp from src to sink, on the arrays. Walks rows in the same
+        order as MaxFlow.edmonds_karp walks a FlowGraph's adjacency lists, so finds
+        the same augmenting paths and pushes the same flows"""
+        s, t = self._ids[src], self._ids[sink]
+        capacity, flow, reverse = self._capacity, self._flow, self._reverse
+
+        if (record := stats.active()) is not None:
+            start = time.perf_counter()
+
+        # per search stamps, so nothing needs resetting between searches
+        queued = [0] * len(self._vertices)
+        done = [0] * len(self._vertices)
+        previous = [0] * len(self._vertices)
+
+        max_flow = 0
+        stamp = 1
+        while path := self._augmenting_path(s, t, stamp, queued, done, previous):
+            bottleneck = min(capacity[arc] - flow[arc] for arc in path)
+            for arc in path:
+                flow[arc] += bottleneck
+                flow[reverse[arc]] -= bottleneck
+
+            self._touched += path
+            max_flow += bottleneck
+            stamp += 1
+
+            if record is not None:
+                record.augmenting_paths += 1
+
+        if record is not None:
+            record.max_flow_times.append(time.perf_counter() - start)
+
+        return max_flow
+
+    def _augmenting_path(
+        self,
+        s: int,
+        t: int,
+        stamp: int,
+        queued: list[int],
+        done: list[int],
+        previous: list[int],
+    ) -> list[int]:
+        """Arcs of the shortest s -> t path with room to push flow, by BFS; empty if
+        there is none. Same rules as Path.BFS: a node is done once dequeued, and
+        one still waiting takes its latest discoverer as its previous node"""
+        start, used, targets = self._start, self._used, self._targets
+        capacity, flow = self._capacity, self._flow
+
+        queue = [s]
+        queued[s] = stamp
+
+        # the queue grows as it's walked
+        for u in queue:
+            done[u] = stamp
+            if u == t:
+                break
+
+            first = start[u]
+            # dead arcs have no capacity, so are never followed
+            for arc in range(first, first + used[u]):
+                if capacity[arc] != flow[arc]:
+                    v = targets[arc]
+                    if done[v] != stamp:
+                        previous[v] = arc
+                        if queued[v] != stamp:
+                            queued[v] = stamp
+                            queue.append(v)
+
+        if (record := stats.active()) is not None:
+            record.bfs_visits += len(queue)
+
+        path: list[int] = []
+        if done[t] != stamp or s == t:
+            return path
+
+        node = t
+        while node != s:
+            arc = previous[node]
+            path.append(arc)
+            node = targets[self._reverse[arc]]
+
+        path.reverse()
+        return path
+
+    def cancel_cycles(self) -> int:
+        """Simplify.cancel_cycles on the arrays; cancels the same loops, in the same
+        order. Returns how many loops were cancelled"""
+        capacity, residual, targets, live = (
+            self._capacity,
+            self._residual,
+            self._targets,
+            self._live,
+        )
+
+        def real_arcs(u: int) -> list[int]:
+            return [arc for arc in self._row(u) if live[arc] and not residual[arc]]
+
+        # 1 => on the current path, 2 => finished with
+        state = [0] * len(self._vertices)
+        position = [0] * len(self._vertices)
+        cancelled = 0
+
+        for root in range(len(self._vertices)):
+            if state[root]:
+                continue
+
+            path = [root]
+            arcs: list[int] = []
+            out = [real_arcs(root)]
+            at = [0]
+            state[root] = 1
+            position[root] = 0
+
+            while path:
+                node = path[-1]
+                candidates = out[-1]
+
+                # next arc not yet cancelled to nothing
+                while at[-1] < len(candidates) and not capacity[candidates[at[-1]]]:
+                    at[-1] += 1
+
+                if at[-1] == len(candidates):
+                    state[node] = 2
+                    path.pop(), out.pop(), at.pop()
+                    if arcs:
+                        arcs.pop()
+                    continue
+
+                arc = candidates[at[-1]]
+                at[-1] += 1
+                target = targets[arc]
+
+                if not state[target]:
+                    state[target] = 1
+                    position[target] = len(path)
+                    path.append(target)
+                    arcs.append(arc)
+                    out.append(real_arcs(target))
+                    at.append(0)
+
+                elif state[target] == 1:
+                    loop = arcs[position[target] :] + [arc]
+                    smallest = min(capacity[arc] for arc in loop)
+
+                    for arc in loop:
+                        capacity[arc] -= smallest
+                    for arc in loop:
+                        if not capacity[arc]:
+                            self._kill(arc)
+
+                    cancelled += 1
+
+                    # back up to the first node whose arc along the path is gone
+                    cut = next(
+                        (n for n, arc in enumerate(arcs) if not capacity[arc]),
+                        len(arcs),
+                    )
+                    for dropped in path[cut + 1 :]:
+                        state[dropped] = 0
+                    del path[cut + 1 :], out[cut + 1 :], at[cut + 1 :], arcs[cut:]
+
+        return cancelled
+
+    def simplify_into(self, clean: FlowGraph) -> None:
+        """Simplify.simplify_debt's loop, run on the arrays: max flow along each real
+        edge, walked in the same order as simplify_debt walks a FlowGraph, with any
+        flow found added to clean as one edge. Uses the graph up"""
+        vertices, residual, targets = self._vertices, self._residual, self._targets
+
+        while self._pairs:
+            for u, node in enumerate(vertices):
+                # the n-th live arc, as iterating over a shrinking list gives
+                n = 0
+                while (arc := self._nth(u, n)) is not None:
+                    n += 1
+                    if residual[arc]:
+                        continue
+
+                    dest = vertices[targets[arc]]
+                    if flow := self.max_flow(node, dest):
+                        clean.add_edge(node, (dest, flow))
+
+                    self._adjust(self._touched)
+                    self._touched.clear()
+
+    def _nth(self, u: int, n: int) -> int | None:
+        """n-th live arc of u's row, None if there are fewer"""
+        live = self._live
+        for arc in self._row(u):
+            if live[arc]:
+                if not n:
+                    return arc
+                n -= 1
+        return None
@@ -1,8 +1,14 @@
 # coding=utf-8
 
-import copy
+import contextlib
+import heapq
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
 
 from src.simplify import path as path
+from src.simplify import stats
+from src.simplify.csr_graph import CSRFlowGraph
 from src.simplify.flow_graph import FlowGraph, FlowEdge
 from src.simplify.graph_objects import Vertex
 
@@ -15,26 +21,359 @@ class NoOptimisations(Exception):
     """No optimisations to graph; already in simplest form"""
 
 
+max_flow_engine = Callable[[FlowGraph, Vertex, Vertex], int]
+"""Function computing (and pushing) the max flow from src -> sink of a graph"""
+
+engine_thresholds = tuple[tuple[int, str], ...]
+"""(largest size, algorithm) pairs for picking a max flow engine by graph size"""
+
+
 class MaxFlow:
+    thresholds: engine_thresholds = ((16, "edmonds_karp"),)
+    """Default (largest size, algorithm) pairs for engine_for; from
+    tests/benchmarks/bench_settle.py's engine runs, Dinic's is a little faster from
+    about 16 people, push-relabel about half as fast"""
+
+    @staticmethod
+    def engine(name: str) -> max_flow_engine:
+        """Looks up a max flow algorithm by name.
+
+        Every engine finds the same max flow, but may route it along other paths,
+        so settling with different engines can give different (equally valid)
+        settled graphs: the same balances, only using edges that were already
+        there"""
+        engines: dict[str, max_flow_engine] = {
+            "edmonds_karp": MaxFlow.edmonds_karp,
+            "dinic": MaxFlow.dinic,
+            "push_relabel": MaxFlow.push_relabel,
+        }
+
+        try:
+            return engines[name]
+        except KeyError:
+            raise SettleError(
+                f"No max flow algorithm called {name!r}; use one of {list(engines)}"
+            )
+
+    @staticmethod
+    def engine_for(
+        size: int,
+        *,
+        thresholds: engine_thresholds | None = None,
+        default: str = "dinic",
+    ) -> max_flow_engine:
+        """Picks a max flow algorithm for a graph with `size` nodes;
+        thresholds are (largest size, algorithm) pairs, checked in order
+        (default MaxFlow.thresholds), with `default` past the last of them"""
+        if thresholds is None:
+            thresholds = MaxFlow.thresholds
+
+        for limit, name in thresholds:
+            if size <= limit:
+                return MaxFlow.engine(name)
+
+        return MaxFlow.engine(default)
+
+    @staticmethod
+    def choose(
+        algorithm: str, size: int, *, thresholds: engine_thresholds | None = None
+    ) -> max_flow_engine:
+        """The engine called algorithm, or if that's "auto", the one engine_for
+        picks for a graph with `size` nodes"""
+        if algorithm == "auto":
+            return MaxFlow.engine_for(size, thresholds=thresholds)
+
+        return MaxFlow.engine(algorithm)
+
     @staticmethod
     def edmonds_karp(graph: FlowGraph, src: Vertex, sink: Vertex) -> int:
 
+        if isinstance(graph, CSRFlowGraph):
+            # same paths, found on the arrays
+            return graph.max_flow(src, sink)
+
         max_flow = 0
+        workspace = path.BFSWorkspace(graph)
+
+        if (record := stats.active()) is not None:
+            start = time.perf_counter()
 
-        while aug_path := MaxFlow.augmenting_path(graph, src, sink):
+        while aug_path := MaxFlow.augmenting_path(graph, src, sink, workspace):
             bottleneck = MaxFlow.bottleneck(graph, aug_path)
             max_flow += bottleneck
 
             MaxFlow.augment_flow(graph, aug_path, bottleneck)
-            # graph.to_dot()
+
+            if record is not None:
+                record.augmenting_paths += 1
+                record.bfs_visits += len(workspace.queue.history)
+
+        if record is not None:
+            # the last search, which didn't reach sink
+            record.bfs_visits += len(workspace.queue.history)
+            record.max_flow_times.append(time.perf_counter() - start)
 
         return max_flow
 
     @staticmethod
-    def augmenting_path(graph: FlowGraph, src: Vertex, sink: Vertex) -> list[Vertex]:
+    def dinic(graph: FlowGraph, src: Vertex, sink: Vertex) -> int:
+        """Dinic's algorithm; each phase builds a level graph with one BFS,
+        then pushes a blocking flow through it, so far fewer BFS passes are needed
+        than augmenting one path at a time"""
+
+        max_flow = 0
+
+        if (record := stats.active()) is not None:
+            start = time.perf_counter()
+
+        while level := MaxFlow.level_graph(graph, src, sink):
+            max_flow += MaxFlow.blocking_flow(graph, src, sink, level)
+
+            if record is not None:
+                record.bfs_visits += len(level)
+
+        if record is not None:
+            record.max_flow_times.append(time.perf_counter() - start)
+
+        return max_flow
+
+    @staticmethod
+    def level_graph(graph: FlowGraph, src: Vertex, sink: Vertex) -> dict[Vertex, int]:
+        """BFS over edges with unused capacity, giving each node its distance from src;
+        returns an empty dict if sink can't be reached"""
+        level = {src: 0}
+        frontier = [src]
+
+        while frontier and sink not in level:
+            next_frontier = []
+            for node in frontier:
+                for edge in graph.flow_neighbours(node):
+                    if edge.node not in level:
+                        level[edge.node] = level[node] + 1
+                        next_frontier.append(edge.node)
+            frontier = next_frontier
+
+        return level if sink in level else {}
+
+    @staticmethod
+    def blocking_flow(
+        graph: FlowGraph, src: Vertex, sink: Vertex, level: dict[Vertex, int]
+    ) -> int:
+        """Pushes flow along src -> sink paths of the level graph until none are left.
+        Walks an explicit stack rather than recursing; each node keeps a pointer to its
+        current arc, so an edge that leads nowhere is never looked at twice in a phase"""
+        current_arc = dict.fromkeys(level, 0)
+        flow = 0
+        record = stats.active()
+
+        nodes: list[Vertex] = [src]
+        edges: list[FlowEdge] = []
+
+        while nodes:
+            node = nodes[-1]
+
+            if node == sink:
+                # push bottleneck down path, and take it off the residual edges
+                bottleneck = min(edge.unused_capacity() for edge in edges)
+                for edge in edges:
+                    edge.push_flow(bottleneck)
+                    graph.get_edge(edge.node, edge.src).push_flow(bottleneck * -1)
+                flow += bottleneck
+
+                if record is not None:
+                    record.augmenting_paths += 1
+
+                # retreat to the tail of the first saturated edge
+                saturated = next(
+                    n for n, edge in enumerate(edges) if not edge.unused_capacity()
+                )
+                del nodes[saturated + 1 :]
+                del edges[saturated:]
+                continue
+
+            adj_list = graph[node]
+            arc = current_arc[node]
+            while arc < len(adj_list):
+                edge = adj_list[arc]
+                if edge.unused_capacity() and level.get(edge.node) == level[node] + 1:
+                    break
+                arc += 1
+            current_arc[node] = arc
+
+            if arc < len(adj_list):
+                # advance
+                nodes.append(edge.node)
+                edges.append(edge)
+            else:
+                # dead end; step back and skip the edge that led here
+                nodes.pop()
+                if edges:
+                    edges.pop()
+                    current_arc[nodes[-1]] += 1
+
+        return flow
+
+    @staticmethod
+    def push_relabel(graph: FlowGraph, src: Vertex, sink: Vertex) -> int:
+        """Highest-label push-relabel with the gap heuristic, and a global relabel
+        after every len(graph) relabels.
+
+        Instead of finding paths, nodes hold excess flow and push it to lower
+        neighbours along residual edges, being relabelled (lifted) when stuck.
+        Runs until only src and sink hold excess, so the result is a proper flow.
+        On debt graphs it's slower than the other engines (see engine_for), so
+        it's only used when asked for by name"""
+
+        if (record := stats.active()) is not None:
+            start = time.perf_counter()
+
+        n = len(graph)
+        excess = dict.fromkeys(graph.nodes(), 0)
+        current_arc = dict.fromkeys(graph.nodes(), 0)
+
+        # active nodes bucketed by height; count of nodes at each height for gaps
+        buckets: list[list[Vertex]] = []
+        count: list[int] = []
+        height: dict[Vertex, int] = {}
+        highest = 0
+        relabels = 0
+
+        def make_room(h: int) -> None:
+            while len(count) <= h:
+                count.append(0)
+                buckets.append([])
+
+        def activate(node: Vertex) -> None:
+            nonlocal highest
+            make_room(height[node])
+            buckets[height[node]].append(node)
+            highest = max(highest, height[node])
+
+        def set_height(node: Vertex, h: int) -> None:
+            make_room(h)
+            count[height[node]] -= 1
+            count[h] += 1
+            height[node] = h
+
+        def global_relabel() -> None:
+            nonlocal highest
+            height.update(MaxFlow.global_labels(graph, src, sink))
+
+            count.clear()
+            buckets.clear()
+            make_room(max(height.values()))
+            for node, h in height.items():
+                count[h] += 1
+                current_arc[node] = 0
+
+            highest = 0
+            for node, node_excess in excess.items():
+                if node_excess and node != src and node != sink:
+                    activate(node)
+
+        def push(node: Vertex, edge: FlowEdge, amount: int) -> None:
+            edge.push_flow(amount)
+            graph.get_edge(edge.node, node).push_flow(amount * -1)
+
+            excess[node] -= amount
+            if not excess[edge.node] and edge.node != src and edge.node != sink:
+                activate(edge.node)
+            excess[edge.node] += amount
+
+        def relabel(node: Vertex) -> None:
+            nonlocal relabels
+            old = height[node]
+            # lift to just above the lowest neighbour it can still push to
+            lowest = min(
+                height[edge.node] for edge in graph[node] if edge.unused_capacity()
+            )
+            set_height(node, lowest + 1)
+            relabels += 1
+
+            # gap heuristic; nothing left at old height => nodes above it can't reach sink
+            if not count[old] and old < n:
+                for other, h in height.items():
+                    if old < h < n:
+                        set_height(other, n + 1)
+
+        global_relabel()
+
+        # saturate everything leaving src
+        for edge in list(graph[src]):
+            if amount := edge.unused_capacity():
+                excess[src] += amount
+                push(src, edge, amount)
+
+        while highest >= 0:
+            if not buckets[highest]:
+                highest -= 1
+                continue
+
+            node = buckets[highest].pop()
+            if height[node] != highest:
+                # lifted by a gap while waiting; file under its new height
+                activate(node)
+                continue
+
+            # discharge node
+            adj_list = graph[node]
+            while excess[node]:
+                if current_arc[node] == len(adj_list):
+                    relabel(node)
+                    current_arc[node] = 0
+                    continue
+
+                edge = adj_list[current_arc[node]]
+                unused = edge.unused_capacity()
+                if unused and height[node] == height[edge.node] + 1:
+                    push(node, edge, min(excess[node], unused))
+                else:
+                    current_arc[node] += 1
+
+            if relabels >= n:
+                relabels = 0
+                global_relabel()
+
+        if record is not None:
+            record.max_flow_times.append(time.perf_counter() - start)
+
+        return excess[sink]
+
+    @staticmethod
+    def global_labels(graph: FlowGraph, src: Vertex, sink: Vertex) -> dict[Vertex, int]:
+        """Exact heights for push-relabel: distance to sink along residual edges;
+        nodes that can't reach sink get len(graph) + their distance to src"""
+        n = len(graph)
+        height = dict.fromkeys(graph.nodes(), 2 * n)
+
+        for root, base in [(sink, 0), (src, n)]:
+            height[root] = base
+            frontier = [root]
+
+            # walk backwards; u -> v is usable if the twin of v's edge to u has room
+            while frontier:
+                next_frontier = []
+                for node in frontier:
+                    for edge in graph[node]:
+                        if height[edge.node] == 2 * n and (
+                            graph.get_edge(edge.node, node).unused_capacity()
+                        ):
+                            height[edge.node] = height[node] + 1
+                            next_frontier.append(edge.node)
+                frontier = next_frontier
+
+        return height
+
+    @staticmethod
+    def augmenting_path(
+        graph: FlowGraph,
+        src: Vertex,
+        sink: Vertex,
+        workspace: path.BFSWorkspace | None = None,
+    ) -> list[Vertex]:
         """find the shortest path from src -> sink using BFS"""
         return path.Path.shortest_path(
-            graph, src, sink, neighbours=graph.flow_neighbours
+            graph, src, sink, neighbours=graph.flow_neighbours, workspace=workspace
         )
 
     @staticmethod
@@ -74,18 +413,449 @@ class MaxFlow:
 
 
 class Simplify:
+    modes = ("max_flow", "greedy", "exact")
+    """Ways of settling a group; see Simplify.settle"""
+
+    exact_limit = 16
+    """Most people with a non-zero balance exact_settle will solve for;
+    its cost grows as n * 2^n"""
+
     @staticmethod
-    def simplify_debt(debt: FlowGraph) -> FlowGraph:
+    def settle(
+        debt: FlowGraph,
+        *,
+        mode: str = "max_flow",
+        algorithm: str = "edmonds_karp",
+        thresholds: engine_thresholds | None = None,
+        exact_limit: int | None = None,
+        split: bool = False,
+        workers: int | None = None,
+        instrument: bool = False,
+    ) -> FlowGraph:
+        """Settles a debt graph.
+        "max_flow" only ever moves debt along existing chains of who owes whom (simplify_debt),
+        "greedy" only keeps everyone's net balance, for the fewest transfers (greedy_settle),
+        "exact" finds the true minimum number of transfers for small groups (exact_settle).
+        algorithm and thresholds pick the max flow engine (see simplify_debt).
+
+        split = True settles each connected component of the graph on its own,
+        over `workers` processes if given (see settle_components).
+
+        instrument = True counts what max flow got up to (see stats.SettleStats);
+        the counts come back as .stats on the settled graph"""
+        if mode not in Simplify.modes:
+            raise SettleError(f"No settling mode {mode!r}; use one of {Simplify.modes}")
+
+        if instrument:
+            with stats.collect() as record:
+                clean = Simplify.settle(
+                    debt,
+                    mode=mode,
+                    algorithm=algorithm,
+                    thresholds=thresholds,
+                    exact_limit=exact_limit,
+                    split=split,
+                    workers=workers,
+                )
+            clean.stats = record
+            return clean
+
+        if split:
+            return Simplify.settle_components(
+                debt,
+                mode=mode,
+                algorithm=algorithm,
+                thresholds=thresholds,
+                exact_limit=exact_limit,
+                workers=workers,
+            )
+
+        if mode == "max_flow":
+            return Simplify.simplify_debt(
+                debt, algorithm=algorithm, thresholds=thresholds
+            )
+        elif mode == "greedy":
+            return Simplify.greedy_settle(debt)
+        else:
+            return Simplify.exact_settle(
+                debt, limit=exact_limit, algorithm=algorithm, thresholds=thresholds
+            )
+
+    @staticmethod
+    def components(debt: FlowGraph) -> list[FlowGraph]:
+        """Splits a graph into its weakly connected components, as separate graphs.
+        People with no debts at all are left out"""
+        position = {node: n for n, node in enumerate(debt.nodes())}
+        seen: set[Vertex] = set()
+        components: list[FlowGraph] = []
+
+        for node in position:
+            if node in seen or not debt[node]:
+                continue
+
+            # every edge has a residual twin going the other way,
+            # so following adjacency lists reaches both ends of every edge
+            seen.add(node)
+            stack, members = [node], []
+            while stack:
+                members.append(current := stack.pop())
+                for edge in debt[current]:
+                    if edge.node not in seen:
+                        seen.add(edge.node)
+                        stack.append(edge.node)
+
+            members.sort(key=position.__getitem__)
+            # compact graphs split into compact graphs
+            components.append(
+                type(debt).from_edges(
+                    (
+                        (member, edge.node, edge.capacity)
+                        for member in members
+                        for edge in debt[member]
+                        if not edge.residual
+                    ),
+                    members,
+                )
+            )
+
+        return components
+
+    @staticmethod
+    def settle_components(
+        debt: FlowGraph,
+        *,
+        mode: str = "max_flow",
+        algorithm: str = "edmonds_karp",
+        thresholds: engine_thresholds | None = None,
+        exact_limit: int | None = None,
+        workers: int | None = None,
+    ) -> FlowGraph:
+        """Settles each connected component of debt separately, then merges them back
+        into one graph; people in different components never owe each other, so
+        there's nothing to gain from running max flow across them.
+        Components are settled in a process pool if workers > 1. Leaves debt as is"""
+
+        components = Simplify.components(debt)
+        record = stats.active()
+        jobs = [
+            (component, mode, algorithm, thresholds, exact_limit, record is not None)
+            for component in components
+        ]
+
+        if workers is not None and workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_settle_component, jobs))
+        else:
+            results = list(map(_settle_component, jobs))
+
+        settled = [graph for graph, _ in results]
+        if record is not None:
+            for _, component_stats in results:
+                # only None when stats weren't asked for, which they were here
+                if component_stats is not None:
+                    record.merge(component_stats)
+
+        if all(graph is None for graph in settled):
+            raise NoOptimisations
+
+        # components that couldn't be simplified go back in as they were
+        clean = FlowGraph.from_edges(
+            (
+                (src, edge.node, edge.capacity)
+                for component, graph in zip(components, settled)
+                for src, adj_list in (graph or component).graph.items()
+                for edge in adj_list
+                if not edge.residual
+            ),
+            debt.nodes(),
+        )
+
+        if debt.net_debt != clean.net_debt:
+            raise SettleError("Settling failed; debt was skewed")
+
+        return clean
+
+    @staticmethod
+    def greedy_settle(debt: FlowGraph) -> FlowGraph:
+        """Settles using net balances alone: the biggest debtor pays the biggest creditor
+        until everyone is square. O(n log n), with at most n - 1 transfers.
+        Raises NoOptimisations if this wouldn't cut the number of transfers"""
+
+        clean = FlowGraph(debt.nodes())
+        Simplify._pay_off(clean, list(debt.net_debt.items()))
+
+        return Simplify._check(debt, clean)
+
+    @staticmethod
+    def exact_settle(
+        debt: FlowGraph,
+        *,
+        limit: int | None = None,
+        algorithm: str = "edmonds_karp",
+        thresholds: engine_thresholds | None = None,
+    ) -> FlowGraph:
+        """Settles using net balances in the fewest transfers possible.
+
+        Splitting the balances into k groups that each sum to zero means they can be
+        paid off in n - k transfers, so the best settlement has the most groups.
+        dp[mask] is the most zero sum groups the people in mask can be split into;
+        found in O(n * 2^n), so groups with more than `limit` people in debt
+        (default Simplify.exact_limit) are settled with simplify_debt instead"""
+
+        if limit is None:
+            limit = Simplify.exact_limit
+
+        balances = [(node, owed) for node, owed in debt.net_debt.items() if owed]
+        n = len(balances)
+
+        if n > limit:
+            return Simplify.simplify_debt(
+                debt, algorithm=algorithm, thresholds=thresholds
+            )
+
+        full = (1 << n) - 1
+
+        # sums[mask]: total balance of the people in mask
+        sums = [0] * (full + 1)
+        for mask in range(1, full + 1):
+            low = mask & -mask
+            sums[mask] = sums[mask ^ low] + balances[low.bit_length() - 1][1]
+
+        # dp[mask] built from the best mask with one person taken out;
+        # last[mask] remembers who, to walk back through the choices
+        dp = [0] * (full + 1)
+        last = [0] * (full + 1)
+        for mask in range(1, full + 1):
+            best, rest = -1, mask
+            while rest:
+                bit = rest & -rest
+                rest ^= bit
+                if dp[mask ^ bit] > best:
+                    best, last[mask] = dp[mask ^ bit], bit
+            dp[mask] = best + (sums[mask] == 0)
+
+        clean = FlowGraph(debt.nodes())
+
+        # walk back from everyone; each time the people left sum to zero,
+        # the people taken out since the last time form one group
+        mask, group = full, []
+        while mask:
+            bit = last[mask]
+            group.append(balances[bit.bit_length() - 1])
+            mask ^= bit
+            if sums[mask] == 0:
+                Simplify._pay_off(clean, group)
+                group = []
+
+        return Simplify._check(debt, clean)
+
+    @staticmethod
+    def _pay_off(clean: FlowGraph, balances: list[tuple[Vertex, int]]) -> None:
+        """Adds transfers to clean squaring up balances; the biggest debtor pays the
+        biggest creditor, so n people take at most n - 1 transfers"""
+
+        # heapq pops smallest first, so debtors' amounts are negated;
+        # creditors' balances are already -ve. n breaks ties without comparing nodes
+        debtors = []
+        creditors = []
+        for n, (node, balance) in enumerate(balances):
+            if balance > 0:
+                debtors.append((-balance, n, node))
+            elif balance < 0:
+                creditors.append((balance, n, node))
+
+        heapq.heapify(debtors)
+        heapq.heapify(creditors)
+
+        while debtors and creditors:
+            owes, i, debtor = heapq.heappop(debtors)
+            owed, j, creditor = heapq.heappop(creditors)
+
+            amount = min(-owes, -owed)
+            clean.add_edge(debtor, (creditor, amount))
+
+            # whoever isn't square yet goes back in
+            if owes + amount:
+                heapq.heappush(debtors, (owes + amount, i, debtor))
+            if owed + amount:
+                heapq.heappush(creditors, (owed + amount, j, creditor))
+
+    @staticmethod
+    def _check(debt: FlowGraph, clean: FlowGraph) -> FlowGraph:
+        """Makes sure settling by balances was worth it and kept everyone's balance"""
+        if Simplify.transfers(clean) >= Simplify.transfers(debt):
+            raise NoOptimisations
+
+        if debt.net_debt != clean.net_debt:
+            raise SettleError("Settling failed; debt was skewed")
+
+        return clean
+
+    @staticmethod
+    def transfers(graph: FlowGraph) -> int:
+        """Number of real (non residual) edges in a graph"""
+        return sum(
+            not edge.residual for adj_list in graph.graph.values() for edge in adj_list
+        )
+
+    @staticmethod
+    def simplify_around(
+        debt: FlowGraph,
+        touched: set[Vertex],
+        *,
+        algorithm: str = "edmonds_karp",
+        thresholds: engine_thresholds | None = None,
+    ) -> FlowGraph:
+        """Simplifies debt in place, only rerouting edges in or out of touched nodes.
+
+        For such an edge u -> v, the max flow from u to v is debt that can be paid
+        straight from u to v; it is taken off the paths it ran along and put on the
+        edge u -> v instead. Net debts stay as they were, and no edge is ever added,
+        so a graph that was already simplified only needs the nodes that new debt
+        was added between looked at. algorithm and thresholds pick the max flow
+        engine, as for simplify_debt"""
+
+        max_flow = MaxFlow.choose(algorithm, len(debt), thresholds=thresholds)
+
+        # real edges out of (and, through residuals, into) each touched node;
+        # dict keeps the order while dropping edges seen from both ends
+        edges = dict.fromkeys(
+            (edge.node, node) if edge.residual else (node, edge.node)
+            for node in sorted(touched, key=lambda node: node.ID)
+            if debt.is_node(node)
+            for edge in debt[node]
+        )
+
+        for src, dest in edges:
+            # earlier reroutes may have paid this edge off already
+            if debt.is_edge(src, dest):
+                if flow := max_flow(debt, src, dest):
+                    debt.adjust_edges()
+                    debt.add_edge(src, (dest, flow), update_debt=False)
+
+        return debt
+
+    @staticmethod
+    def cancel_cycles(debt: FlowGraph) -> int:
+        """Cancels out loops of debt (A owes B owes C owes A) in place, taking the
+        smallest debt in each loop off every edge of it; net debts don't change.
+        Returns how many loops were cancelled.
+
+        Iterative DFS over real edges; a loop is found when an edge leads back to a
+        node on the current path. Cancelling only ever removes edges, so nodes that
+        are finished with can't end up in a loop later and are never looked at again;
+        the path is cut back to just before the first edge cancelled to nothing"""
+
+        if isinstance(debt, CSRFlowGraph):
+            return debt.cancel_cycles()
+
+        # 1 => on the current path, 2 => finished with
+        state: dict[Vertex, int] = {}
+        cancelled = 0
+
+        for root in debt.nodes():
+            if root in state:
+                continue
+
+            # path[i] -> path[i + 1] along edges[i]; out[i], at[i] is what's left
+            # to look at of path[i]'s real edges
+            path = [root]
+            edges: list[FlowEdge] = []
+            out = [[edge for edge in debt[root] if not edge.residual]]
+            at = [0]
+            state[root] = 1
+            position = {root: 0}
+
+            while path:
+                node = path[-1]
+                candidates = out[-1]
+
+                # next edge not yet cancelled to nothing
+                while at[-1] < len(candidates) and not candidates[at[-1]].capacity:
+                    at[-1] += 1
+
+                if at[-1] == len(candidates):
+                    state[node] = 2
+                    del position[node]
+                    path.pop(), out.pop(), at.pop()
+                    if edges:
+                        edges.pop()
+                    continue
+
+                edge = candidates[at[-1]]
+                at[-1] += 1
+                target = edge.node
+
+                if target not in state:
+                    state[target] = 1
+                    position[target] = len(path)
+                    path.append(target)
+                    edges.append(edge)
+                    out.append([edge for edge in debt[target] if not edge.residual])
+                    at.append(0)
+
+                elif state[target] == 1:
+                    loop = edges[position[target] :] + [edge]
+                    smallest = min(edge.capacity for edge in loop)
+
+                    for edge in loop:
+                        edge.capacity -= smallest
+                    for edge in loop:
+                        if not edge.capacity:
+                            debt.pop_edge(edge.src, edge.node)
+
+                    cancelled += 1
+
+                    # back up to the first node whose edge along the path is gone
+                    cut = next(
+                        (n for n, edge in enumerate(edges) if not edge.capacity),
+                        len(edges),
+                    )
+                    for dropped in path[cut + 1 :]:
+                        del state[dropped], position[dropped]
+                    del path[cut + 1 :], out[cut + 1 :], at[cut + 1 :], edges[cut:]
+
+        return cancelled
+
+    @staticmethod
+    def simplify_debt(
+        debt: FlowGraph,
+        *,
+        algorithm: str = "edmonds_karp",
+        thresholds: engine_thresholds | None = None,
+        cancel_cycles: bool = True,
+    ) -> FlowGraph:
         """
         for edge(u, v) in graph:
             if new := maxflow(u, v):
                 clean.add_edge(u, (v, new))
                 messy.adjust_edges()
+
+        algorithm picks the max flow engine (see MaxFlow.engine);
+        "auto" picks one from the number of people in the graph, going by
+        thresholds (see MaxFlow.engine_for). Engines can
+        settle to different graphs, but always keep balances and never add edges.
+        cancel_cycles runs Simplify.cancel_cycles first, so max flow has less to do
         """
 
+        max_flow = MaxFlow.choose(algorithm, len(debt), thresholds=thresholds)
+
+        if isinstance(debt, CSRFlowGraph) and max_flow is not MaxFlow.edmonds_karp:
+            # the other engines walk edge objects, which compact graphs only make
+            # on demand; settle a FlowGraph instead
+            debt = debt.to_graph()
+
         clean = FlowGraph(debt.nodes())
 
-        d_cache = copy.deepcopy(debt)
+        # settling uses debt up; keep what it has to be checked against afterwards
+        before = debt.fingerprint()
+        net_debt = dict(debt.net_debt)
+
+        if cancel_cycles:
+            Simplify.cancel_cycles(debt)
+
+        if isinstance(debt, CSRFlowGraph):
+            debt.simplify_into(clean)
 
         # iterate through edges in graph:
         while not not debt:
@@ -94,15 +864,38 @@ class Simplify:
 
                 for edge in adj_list:  # type: ignore
                     if not edge.residual:
-                        if flow := MaxFlow.edmonds_karp(debt, node, edge.node):
+                        if flow := max_flow(debt, node, edge.node):
                             clean.add_edge(node, (edge.node, flow))
                         debt.adjust_edges()
 
-        if clean == d_cache:
-            clean.to_dot(n=1)
+        if clean.fingerprint() == before:
             raise NoOptimisations
 
-        if d_cache.net_debt != clean.net_debt:
+        if net_debt != clean.net_debt:
             raise SettleError("Settling failed; debt was skewed")
 
         return clean
+
+
+def _settle_component(
+    job: tuple[FlowGraph, str, str, engine_thresholds | None, int | None, bool]
+) -> tuple[FlowGraph | None, stats.SettleStats | None]:
+    """Settles one component for Simplify.settle_components; None if it can't be
+    simplified, along with its stats if asked for. Top level, so it can be sent
+    to a process pool, where stats being collected in the parent aren't visible"""
+    component, mode, algorithm, thresholds, exact_limit, instrument = job
+
+    with stats.collect() if instrument else contextlib.nullcontext() as record:
+        try:
+            # settling uses the graph up; keep the component to fall back on
+            clean = Simplify.settle(
+                component.clone(),
+                mode=mode,
+                algorithm=algorithm,
+                thresholds=thresholds,
+                exact_limit=exact_limit,
+            )
+        except NoOptimisations:
+            clean = None
+
+    return clean, record
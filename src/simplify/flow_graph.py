@@ -1,12 +1,21 @@
 # coding=utf-8
+import bisect
 from dataclasses import dataclass
+from operator import itemgetter
+from typing import Iterable
 
-from src.simplify.base_graph import GenericDigraph, GraphError
+from src.simplify import stats
+from src.simplify.base_graph import GenericDigraph
 from src.simplify.graph_objects import Vertex
+from src.simplify.stats import SettleStats
 
 """Flow Graph"""
 
 
+edge_stream = Iterable[tuple[Vertex | int, Vertex | int, int]]
+"""(src, dest, amount) rows; src and dest either vertices or vertex IDs"""
+
+
 class FlowEdgeError(Exception):
     ...
 
@@ -35,12 +44,23 @@ class FlowEdge:
         return self.__str__()
 
     def __eq__(self, other):
-        # TODO: write this properly
-        return str(self) == str(other)
+        if not isinstance(other, FlowEdge):
+            return NotImplemented
+        return (self.node, self.capacity, self.flow, self.residual) == (
+            other.node,
+            other.capacity,
+            other.flow,
+            other.residual,
+        )
 
     def __lt__(self, other):
         return self.capacity < other.capacity
 
+    def copy(self) -> "FlowEdge":
+        copy = FlowEdge(self.src, self.node, self.capacity, self.flow)
+        copy.residual = self.residual
+        return copy
+
     def to_dot(self):
         base = f'[label="  {self.flow}/{self.capacity}  "]'
         return base[:-1] + ", color=red]" if self.residual else base
@@ -53,7 +73,6 @@ class FlowEdge:
         """Pushes flow down an edge; raises error if too much"""
         current = self.flow
         if (new := flow + current) > self.capacity:
-            print(new, self.unused_capacity())
             # raise error
             raise FlowEdgeError(
                 f"Tried to add {flow} units of flow"
@@ -79,7 +98,92 @@ class FlowEdge:
                 raise EdgeCapacityZero(self, new)
 
 
-class FlowGraph(GenericDigraph):
+def by_capacity(arc: list) -> int:
+    """Sort key putting [dest, capacity] arcs in descending order of capacity"""
+    return -arc[1]
+
+
+def replay(
+    edges: edge_stream, nodes: list[Vertex] | None = None
+) -> tuple[dict[Vertex, list[list]], dict[Vertex, int]]:
+    """Adds up (src, dest, amount) rows the way FlowGraph.add_edge would, without
+    making edge objects. Returns each node's edges as [dest, capacity] (0 for
+    residuals), in the order add_edge leaves them, and everyone's net debt"""
+
+    adj: dict[Vertex, list[list]] = {node: [] for node in nodes or []}
+    net_debt: dict[Vertex, int] = dict.fromkeys(adj, 0)
+
+    # edge u -> v, real or residual, by its ends
+    arcs: dict[tuple[Vertex, Vertex], list] = {}
+
+    # lists whose capacities changed since they were last sorted; the rest are in
+    # order, so a new edge can go straight into place
+    unsorted: set[Vertex] = set()
+
+    for src, dest, amount in edges:
+        if not isinstance(src, Vertex):
+            src = Vertex(int(src))
+        if not isinstance(dest, Vertex):
+            dest = Vertex(int(dest))
+        amount = int(amount)
+        if amount < 0:
+            src, dest, amount = dest, src, -amount
+
+        for node in src, dest:
+            if node not in adj:
+                adj[node] = []
+                net_debt[node] = 0
+
+        net_debt[src] += amount
+        net_debt[dest] -= amount
+
+        if not amount:
+            continue
+
+        fwd = arcs.get((src, dest))
+
+        if fwd is not None and fwd[1]:
+            fwd[1] += amount
+            unsorted.add(src)
+            continue
+
+        if fwd is not None:
+            # real edge going the other way; pay it off first
+            back = arcs[dest, src]
+            if back[1] > amount:
+                back[1] -= amount
+                unsorted.add(dest)
+                continue
+
+            # only one edge to each node in a list, so remove can't get the wrong one
+            adj[dest].remove(back)
+            adj[src].remove(fwd)
+            del arcs[src, dest], arcs[dest, src]
+
+            if not (amount := amount - back[1]):
+                continue
+
+        # new pair; the real edge is sorted into place (after any of the same
+        # capacity), as add_edge does
+        real, residual = [dest, amount], [src, 0]
+        adj[dest].append(residual)
+        arcs[src, dest], arcs[dest, src] = real, residual
+
+        row = adj[src]
+        if src in unsorted:
+            row.append(real)
+            row.sort(key=itemgetter(1), reverse=True)
+            unsorted.discard(src)
+        else:
+            row.insert(bisect.bisect_right(row, -amount, key=by_capacity), real)
+
+    return adj, net_debt
+
+
+class FlowGraph(GenericDigraph[FlowEdge]):
+    stats: SettleStats | None = None
+    """Set on settled graphs when Simplify.settle was asked to instrument"""
+
     def __init__(self, vertices: list[Vertex]):
 
         super().__init__(vertices)
@@ -87,12 +191,74 @@ class FlowGraph(GenericDigraph):
         # map to keep track of people's net debts; +ve if owes group, -ve if owed by group
         self.net_debt: dict[Vertex, int] = {node: 0 for node in vertices}
 
+    @classmethod
+    def from_edges(
+        cls, edges: edge_stream, nodes: list[Vertex] | None = None
+    ) -> "FlowGraph":
+        """Builds a graph from a stream of (src, dest, amount) in one pass;
+        gives the same graph, edge order included, as calling add_edge for each row.
+
+        Rows are added up on plain lists (see replay), and an edge object is only
+        made for each edge left at the end.
+        edges can be any iterable, e.g. a generator or a DB cursor; vertex IDs
+        (or strings of them, from a CSV reader) are turned into vertices.
+        Nodes come in the order given, then in the order they turn up in"""
+
+        adj, net_debt = replay(edges, nodes)
+
+        graph = cls(list(adj))
+        graph.net_debt.update(net_debt)
+
+        for src, row in adj.items():
+            graph.graph[src] = [FlowEdge(src, dest, capacity) for dest, capacity in row]
+        graph._reindex()
+
+        return graph
+
     def __bool__(self):
         """Returns true if not empty"""
         return not ({node: [] for node in self.nodes()} == self.graph)
 
     def __eq__(self, other):
-        return str(self) == str(other)
+        """Same people, and the same debts between them"""
+        if not isinstance(other, FlowGraph):
+            return NotImplemented
+        return (
+            self.graph.keys() == other.graph.keys()
+            and self.fingerprint() == other.fingerprint()
+        )
+
+    def clone(self) -> "FlowGraph":
+        """Copy of the graph, flows and net debts included, that settling can
+        use up without touching this one"""
+        clone = FlowGraph([])
+        clone.graph = {
+            node: [edge.copy() for edge in adj_list]
+            for node, adj_list in self.graph.items()
+        }
+        clone._backwards_graph = {node: [] for node in self.graph}
+        clone._reindex()
+        clone.net_debt = dict(self.net_debt)
+        return clone
+
+    def balances(self) -> list[int]:
+        """Net debts of nodes() (in that order); add_edge and from_edges keep
+        net_debt up to date as edges go in, so this doesn't look at edges"""
+        return [self.net_debt[node] for node in self.nodes()]
+
+    def fingerprint(self) -> frozenset[tuple[Vertex, Vertex, int]]:
+        """(src, dest, capacity) of every real edge; doesn't depend on the order
+        edges were added in, and is hashable, so can be used to spot changes"""
+        return frozenset(
+            (src, edge.node, edge.capacity)
+            for src, adj_list in self.graph.items()
+            for edge in adj_list
+            if not edge.residual
+        )
+
+    def add_node(self, v: Vertex) -> None:
+        super().add_node(v)
+        self.net_debt[v] = 0
 
     @staticmethod
     def edge_from_nodes(node: Vertex, list_: list[FlowEdge]) -> FlowEdge:  # type: ignore
@@ -106,48 +272,48 @@ class FlowGraph(GenericDigraph):
         for node in [src, dest]:
             self.sanitize(node)
 
-        return GenericDigraph.edge_from_nodes(dest, self[src])  # type: ignore
+        return self.edge_to(src, dest)  # type: ignore
 
     def is_edge(self, s: Vertex, t: Vertex, *, residual=False) -> bool:
         """Checks for edge in a graph; residual = True allows broadening to include residual edges"""
-        try:
-            edge = self.edge_from_nodes(t, self[s])
-            if residual:
-                return True
-            else:
-                return False if edge.residual else True
-
-        except GraphError:
+        if (edge := self._edges[s].get(t)) is None:
             return False
 
+        return residual or not edge.residual
+
     def add_edge(self, src: Vertex, *edges: tuple[Vertex, int], update_debt=True):
         """Add a FlowEdge to graph, and also add a residual edge"""
         for dest, capacity in edges:
             # make sure nodes in graph
             self.sanitize(src, dest)
 
+            fwd = self._edges[src].get(dest)
+
             # no existing edge between two nodes
-            if not (self.is_edge(src, dest) or self.is_edge(dest, src)):
+            if fwd is None:
                 # add normal edge
-                self[src].append(FlowEdge(src, dest, capacity))
+                self._link(src, FlowEdge(src, dest, capacity))
                 # add residual edge
-                self[dest].append(FlowEdge(dest, src, 0))
+                self._link(dest, FlowEdge(dest, src, 0))
 
                 self[src].sort(reverse=True)
 
             # edge going in direction of edge being added
-            elif self.is_edge(src, dest):
-                self.get_edge(src, dest).capacity += capacity
+            elif not fwd.residual:
+                fwd.capacity += capacity
 
-            elif self.is_edge(dest, src, residual=False):
-                new_cap = self.get_edge(dest, src).capacity - capacity
+            # otherwise there's a real edge going the other way
+            else:
+                back = self._edges[dest][src]
+                new_cap = back.capacity - capacity
                 # if new capacity is 0 pop edge
 
                 if new_cap > 0:
-                    self.get_edge(dest, src).capacity = new_cap
+                    back.capacity = new_cap
                 if new_cap < 0:
                     self.pop_edge(dest, src)
-                    self.add_edge(src, (dest, new_cap * -1))
+                    # debt for the whole amount is handled below
+                    self.add_edge(src, (dest, new_cap * -1), update_debt=False)
                 if new_cap == 0:
                     self.pop_edge(dest, src)
 
@@ -160,18 +326,11 @@ class FlowGraph(GenericDigraph):
         """removes REAL edges, and deletes residual counterpart"""
 
         # normal
-        fwd_edge = self.edge_from_nodes(dest, self[src])
-        self[src].remove(fwd_edge)
+        fwd_edge = self.edge_to(src, dest)
+        self._unlink(src, fwd_edge)
         # residual
-        res = self.edge_from_nodes(src, self[dest])
-        if res.node == src:
-            # assert self[dest][0] == self[dest][1]
-            self[dest].remove(res)
-
-        else:
-            raise ValueError(
-                f"Tried to pop residual edge; intended {dest} -> {src}, got {dest} -> {res.node}"
-            )
+        res = self.edge_to(dest, src)
+        self._unlink(dest, res)
 
         if update_debt:
             # handle net_debt;
@@ -190,9 +349,13 @@ class FlowGraph(GenericDigraph):
         delete ede + residual counterpart"""
 
         edge: FlowEdge
+        record = stats.active()
 
         for n, node in enumerate(self.nodes()):
-            for edge in self[node]:
+            # iterate over a copy; popping edges shortens the list
+            for edge in list(self[node]):
+                if record is not None and edge.flow and not edge.residual:
+                    record.edges_adjusted += 1
                 try:
                     edge.adjust_edge()
                 except EdgeCapacityZero:
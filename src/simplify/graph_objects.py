@@ -1,5 +1,6 @@
 # coding=utf-8
 
+import weakref
 from dataclasses import dataclass
 
 
@@ -10,23 +11,62 @@ class FlowError(Exception):
     ...
 
 
-@dataclass
 class Vertex:
-    """Representation of a vertex; carries data and ID"""
+    """Representation of a vertex; carries data and ID.
+
+    Vertices are interned: Vertex(ID, label) hands back the same object for as long
+    as one with that ID and label is alive, so equality is identity and the hash is
+    worked out once. Vertices are immutable"""
+
+    __slots__ = ("ID", "label", "_hash", "__weakref__")
 
     ID: int  # IDs should be unique
-    label: str = ""  # optional label
+    label: str  # optional label
+
+    _registry: "weakref.WeakValueDictionary[tuple[int, str], Vertex]" = (
+        weakref.WeakValueDictionary()
+    )
+
+    def __new__(cls, ID: int, label: str = ""):
+        key = (ID, label)
+        if (vertex := cls._registry.get(key)) is None:
+            vertex = super().__new__(cls)
+            object.__setattr__(vertex, "ID", ID)
+            object.__setattr__(vertex, "label", label)
+            object.__setattr__(vertex, "_hash", hash(key))
+            vertex = cls._registry.setdefault(key, vertex)
+
+        return vertex
 
     def _key(self) -> tuple:
         """Returns immutable repr of object for hashing"""
         return self.ID, self.label
 
+    def __setattr__(self, name, value):
+        raise AttributeError("Vertices are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Vertices are immutable")
+
     def __str__(self):
         return self.label if self.label else str(self.ID)
 
+    def __repr__(self):
+        return f"Vertex(ID={self.ID!r}, label={self.label!r})"
+
     def __hash__(self):
         """for adding to lists / dicts"""
-        return hash(bytes(f"{self._key()}".encode("utf8")))
+        return self._hash
+
+    def __reduce__(self):
+        # unpickled vertices go through __new__, so are interned too
+        return Vertex, self._key()
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
 
 @dataclass
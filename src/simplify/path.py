@@ -1,16 +1,14 @@
 # coding=utf-8
 import logging
-import sys
+from collections import deque
 from dataclasses import dataclass
 from typing import Callable
 
-from ordered_set import OrderedSet
-
-# initialise logger
 import src.simplify.graph_objects
 from src.simplify import base_graph as graphs
 
-logging.basicConfig(stream=sys.stdout, encoding="utf-8", level=logging.DEBUG)
+# configuring handlers / levels is left to whatever is running the simplifier
+logger = logging.getLogger(__name__)
 
 
 # typing
@@ -51,25 +49,56 @@ def str_map(generic_map: disc_map | prev_map) -> str:
 
 @dataclass(init=False)
 class BFSQueue:
+    """FIFO queue for BFS; a vertex already waiting in the queue isn't added again.
+    Keeps a history of every vertex that has been queued, so that a search can
+    be cleaned up afterwards by only touching what it visited"""
+
     def __init__(self, *args: src.simplify.graph_objects.Vertex):
-        self.data: OrderedSet[src.simplify.graph_objects.Vertex] = OrderedSet(args)
+        self.data: deque[src.simplify.graph_objects.Vertex] = deque()
+        self.waiting: set[src.simplify.graph_objects.Vertex] = set()
+        self.history: list[src.simplify.graph_objects.Vertex] = []
+        self.enqueue(*args)
 
     def __str__(self):
-        str_ = ""
-        for datum in self.data:
-            str_ += str(datum).upper()
-        return str_
+        return "".join(str(datum).upper() for datum in self.data)
 
     def enqueue(self, *args: src.simplify.graph_objects.Vertex):
         for v in args:
-            graphs.GenericDigraph.sanitize(v)
-            self.data.append(v)
+            if v not in self.waiting:
+                self.waiting.add(v)
+                self.data.append(v)
+                self.history.append(v)
 
     def dequeue(self):
-        return self.data.pop(0)
+        v = self.data.popleft()
+        self.waiting.discard(v)
+        return v
 
     def is_empty(self) -> bool:
-        return not len(self.data)
+        return not self.data
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.waiting.clear()
+        self.history.clear()
+
+
+class BFSWorkspace:
+    """discovered / previous maps for a graph, built once and reused between searches;
+    resetting only undoes entries for the vertices the last search queued.
+    Only valid while the graph's set of nodes doesn't change"""
+
+    def __init__(self, graph: graphs.GenericDigraph):
+        nodes = graph.nodes()
+        self.discovered: disc_map = dict.fromkeys(nodes, False)
+        self.previous: prev_map = dict.fromkeys(nodes)
+        self.queue = BFSQueue()
+
+    def reset(self) -> None:
+        for node in self.queue.history:
+            self.discovered[node] = False
+            self.previous[node] = None
+        self.queue.clear()
 
 
 class Path:
@@ -96,7 +125,7 @@ class Path:
             # start = list(graph.graph.keys())[random.randint(0, n - 1)]
             # queue.enqueue(start)
             start = next(iter(graph.graph))
-            logging.debug(f"starting from {start}")
+            logger.debug("starting from %s", start)
 
             # queue.enqueue(next(iter(graph.graph)))
 
@@ -108,22 +137,28 @@ class Path:
         source: src.simplify.graph_objects.Vertex,
         sink: src.simplify.graph_objects.Vertex,
         neighbours: Callable,
+        workspace: BFSWorkspace | None = None,
     ) -> list[src.simplify.graph_objects.Vertex]:
         """
-        Uses a recursive implementation of BFS to find path between nodes
+        Uses BFS to find path between nodes
         Accepts graph, source node, sink node, returns list of nodes, which is the path from src to sink
+        Pass in a workspace to reuse its structures when searching the same graph repeatedly
         """
 
         # create queue, discovered list, previous list
-        queue, discovered, prev = Path.build_bfs_structs(graph, source)
+        if workspace is None:
+            workspace = BFSWorkspace(graph)
+        else:
+            workspace.reset()
+
+        workspace.queue.enqueue(source)
 
-        # recursive call
         previous = Path.BFS(
             graph=graph,
-            queue=queue,
-            discovered=discovered,
+            queue=workspace.queue,
+            discovered=workspace.discovered,
             target=sink,
-            previous=prev,
+            previous=workspace.previous,
             neighbours=neighbours,
         )
 
@@ -136,12 +171,14 @@ class Path:
         """Given a mapping of previous nodes, reconstructs a path to sink"""
         path: list[src.simplify.graph_objects.Vertex] = [sink]
 
-        while current := previous[path[0]]:
-            path.insert(0, current)
+        while current := previous[path[-1]]:
+            path.append(current)
 
-        if path[0] == sink:
-            path = []
+        # only sink in path => never reached
+        if len(path) == 1:
+            return []
 
+        path.reverse()
         return path
 
     @staticmethod
@@ -161,45 +198,28 @@ class Path:
         Can pass in a function `do_to_neighbour` to do to all nodes during the BFS
 
         neighbour function need to return edge
-        """
-        # breakpoint: f"q: {queue}\n discovered: {str_map(discovered)}\nprev: {str_map(prev)}"
 
-        # will only happen if no path to node
-        if queue.is_empty():
-            return previous
+        Iterative, so path length isn't limited by the recursion limit. A node still
+        waiting in the queue takes its latest discoverer as its previous node
+        """
 
-        else:
+        while not queue.is_empty():
             # discover next node in queue
             current = queue.dequeue()
             discovered[current] = True
 
-            # check we haven't been fed a standalone node (i.e. no forward or backwards links)
-            if not graph.connected(current):
-                if not queue:
-                    raise SearchError("Cannot traverse a non connected node", current)
-
-            # if discovered target node return prev
+            # if discovered target node stop searching
             if current == target:
-                return previous
-
-            else:
-                # otherwise, continue on
-                # enqueue neighbours, keep track of whose neighbours they are given not already discovered
-                # do passed in function to neighbouring nodes
-                for neighbour in neighbours(current):
-                    if not discovered[neighbour.node]:
-                        previous[neighbour.node] = current
-                        queue.enqueue(neighbour.node)
-
-                    do_to_neighbour(current, neighbour.node)
-
-                # recursive call on new state
-                return Path.BFS(
-                    graph=graph,
-                    queue=queue,
-                    discovered=discovered,
-                    target=target,
-                    previous=previous,
-                    neighbours=neighbours,
-                    do_to_neighbour=do_to_neighbour,
-                )
+                break
+
+            # enqueue neighbours, keep track of whose neighbours they are given not already discovered
+            # do passed in function to neighbouring nodes
+            for neighbour in neighbours(current):
+                node = neighbour.node
+                if not discovered[node]:
+                    previous[node] = current
+                    queue.enqueue(node)
+
+                do_to_neighbour(current, node)
+
+        return previous
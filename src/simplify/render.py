@@ -0,0 +1,76 @@
+# coding=utf-8
+
+"""
+Renders graphs with graphviz on a background thread, so that settling never
+waits on graphviz. Graphs are snapshotted (clone()) when handed over, and their
+dot source is streamed to a file rather than built up in memory
+"""
+
+import os
+import queue
+import subprocess
+import threading
+
+import graphviz
+
+from src.simplify.base_graph import GenericDigraph
+
+
+class RenderQueue:
+    """Background renderer; submit() graphs, join() to wait for them to be drawn"""
+
+    def __init__(self, directory: str = "./graph_renders", format: str = "svg"):
+        self.directory = directory
+        self.format = format
+
+        # renders that went wrong, e.g. graphviz not installed; never raised
+        self.errors: list[Exception] = []
+
+        self._jobs: queue.Queue[tuple[GenericDigraph, str]] = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def submit(self, graph: GenericDigraph, *, n: int = 0, title="graph") -> None:
+        """Queues graph to be rendered to {directory}/{title}{n}.{format};
+        same file names as GenericDigraph.to_dot"""
+        self._jobs.put((graph.clone(), f"{title}{n}"))
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def join(self) -> None:
+        """Waits for everything submitted so far to be rendered"""
+        self._jobs.join()
+
+    def _run(self) -> None:
+        while True:
+            graph, name = self._jobs.get()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, name)
+
+                graph.write_dot(path)
+                graphviz.render("dot", self.format, path)
+
+            except (
+                graphviz.ExecutableNotFound,
+                subprocess.CalledProcessError,
+                OSError,
+            ) as e:
+                self.errors.append(e)
+
+            finally:
+                self._jobs.task_done()
+
+
+_default: RenderQueue | None = None
+
+
+def default_queue() -> RenderQueue:
+    """Render queue shared by everything that renders while settling"""
+    global _default
+    if _default is None:
+        _default = RenderQueue()
+    return _default
@@ -0,0 +1,61 @@
+# coding=utf-8
+
+"""
+Counters for what MaxFlow and Simplify get up to while settling.
+Off unless something is collecting (see collect()); while off, the only cost is
+one lookup per max flow call / adjust_edges pass, never one per vertex or edge
+"""
+
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+
+@dataclass
+class SettleStats:
+    """What one settle did"""
+
+    augmenting_paths: int = 0
+    # vertices queued across every BFS (Edmonds-Karp) / level graph (Dinic)
+    bfs_visits: int = 0
+    # real edges whose capacity was changed or which were deleted by adjust_edges
+    edges_adjusted: int = 0
+    # seconds taken by each max flow call, in order
+    max_flow_times: list[float] = field(default_factory=list)
+
+    @property
+    def max_flow_calls(self) -> int:
+        return len(self.max_flow_times)
+
+    @property
+    def max_flow_time(self) -> float:
+        return sum(self.max_flow_times)
+
+    def merge(self, other: "SettleStats") -> None:
+        """Adds the counts of other (e.g. from one component of a graph) onto these"""
+        self.augmenting_paths += other.augmenting_paths
+        self.bfs_visits += other.bfs_visits
+        self.edges_adjusted += other.edges_adjusted
+        self.max_flow_times.extend(other.max_flow_times)
+
+
+# stats being collected into, per thread; the server settles from several threads
+_local = threading.local()
+
+
+def active() -> SettleStats | None:
+    """Stats currently being collected on this thread, None if switched off"""
+    return getattr(_local, "current", None)
+
+
+@contextmanager
+def collect() -> Iterator[SettleStats]:
+    """Collects stats for everything settled inside the with block;
+    nests, with the inner block getting its own stats"""
+    previous = active()
+    _local.current = record = SettleStats()
+    try:
+        yield record
+    finally:
+        _local.current = previous
@@ -4,7 +4,7 @@ from src.simplify.base_graph import GenericDigraph, GraphError
 from src.simplify.graph_objects import Vertex, WeightedEdge
 
 
-class WeightedDigraph(GenericDigraph):
+class WeightedDigraph(GenericDigraph[WeightedEdge]):
     def add_edge(self, source: Vertex, *edges: tuple[Vertex, int]) -> None:
 
         # sanitize source
@@ -12,11 +12,11 @@ class WeightedDigraph(GenericDigraph):
         for node, weight in edges:
             if self.is_edge(source, node):
                 existing: WeightedEdge
-                existing = self.edge_from_nodes(node, self[source])  # type: ignore
+                existing = self.edge_to(source, node)  # type: ignore
                 existing.weight += weight
             else:
                 self.sanitize(node)
-                self.graph[source].append(WeightedEdge(node, weight))
+                self._link(source, WeightedEdge(node, weight))
                 self._backwards_graph[node].append(WeightedEdge(source, weight * -1))
 
     def flow_through(self, node: Vertex) -> int:
@@ -40,7 +40,7 @@ class WeightedDigraph(GenericDigraph):
     def is_edge(self, s: Vertex, t: Vertex) -> int:
         try:
             edge: WeightedEdge
-            edge = self.edge_from_nodes(t, self.graph[s])  # type: ignore
+            edge = self.edge_to(s, t)  # type: ignore
             return edge.weight
         except GraphError:
             return 0
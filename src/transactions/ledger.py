@@ -1,15 +1,27 @@
 # coding=utf-8
 
 import csv
+import logging
 import os
+import signal
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass, field
+from typing import Iterable, Iterator
 
 import src.simplify.flow_algorithms
 import src.simplify.flow_graph as flow
+from src.simplify import render as renders
+from src.simplify.csr_graph import CSRFlowGraph
 from src.crypto import keys
 from src.simplify.flow_algorithms import Simplify, SettleError
 from src.simplify.graph_objects import Vertex
-from src.transactions.transaction import Transaction, VerificationError
+from src.simplify.stats import SettleStats
+from src.transactions.transaction import Transaction, VerificationError, verify_batch
+
+# configuring handlers / levels is left to whatever is running the simplifier
+logger = logging.getLogger(__name__)
 
 
 class LedgerBuildError(Exception):
@@ -25,11 +37,12 @@ class Ledger:
     """Multiple transactions contained to one group (assumed from building);
     built from a stream of transaction objects"""
 
-    # ledger, big list of transactions;
-    # TODO: maybe make ledger generator
+    # ledger, big list of transactions; see StreamingLedger for not keeping them
     ledger: list[Transaction] = field(default_factory=lambda: [])
     nodes: list[Vertex] = field(default_factory=lambda: [])
-    key_map: dict[int, keys.RSAPublicKey] = field(default_factory=lambda: {})
+    key_map: dict[int, keys.any_public_key] = field(default_factory=lambda: {})
+    # what the last instrumented simplify_ledger did; see Simplify.settle
+    stats: SettleStats | None = None
 
     def __bool__(self):
         """False if ledger empty"""
@@ -52,33 +65,45 @@ class Ledger:
 
         return self.ledger
 
-    def _verify_transactions(self) -> None:
-        """Verifies the keys of all the transactions in the group.
-        Raises error if a faulty transaction is found"""
-
+    def balances(self) -> dict[int, int]:
+        """Net balance of everyone in the ledger, by user ID;
+        +ve if they owe the group, -ve if owed"""
+        owed: dict[int, int] = {}
         for trn in self.ledger:
-            trn.verify()
-
-    def _as_flow(self) -> flow.FlowGraph:
-        """Returns ledger as a flow graph"""
-        # Extract IDs involved -> nodes
-        nodes: set[Vertex] = set()
+            owed[trn.src] = owed.get(trn.src, 0) + trn.amount
+            owed[trn.dest] = owed.get(trn.dest, 0) - trn.amount
+
+        return owed
+
+    def _verify_transactions(self, *, workers: int | None = None) -> None:
+        """Verifies the keys of all the transactions in the group, as one batch
+        (see transaction.verify_batch) across `workers` processes (default one per
+        CPU). Raises error if a faulty transaction is found"""
+
+        results = verify_batch(self.ledger, workers=workers)
+        if not all(results):
+            failed = [trn.ID for trn, valid in zip(self.ledger, results) if not valid]
+            raise VerificationError(f"Transactions {failed} failed verification")
+
+    def _as_flow(self, *, workers: int | None = None) -> flow.FlowGraph:
+        """Returns ledger as a flow graph, verifying it on the way
+        (see _verify_transactions)"""
+        # Extract IDs involved -> nodes; one vertex per ID
+        nodes: dict[int, Vertex] = {}
         for trn in self.ledger:
-            nodes.add(Vertex(trn.src))
-            nodes.add(Vertex(trn.dest))
+            for ID in trn.src, trn.dest:
+                if ID not in nodes:
+                    nodes[ID] = Vertex(ID)
 
-        self.nodes = list(nodes)
-        self.nodes.sort(key=lambda node: node.ID)
+        self.nodes = sorted(nodes.values(), key=lambda node: node.ID)
 
-        # build flow graph with nodes
-        as_flow = flow.FlowGraph(self.nodes)
+        self._verify_transactions(workers=workers)
 
-        # verify transaction, add to graph
-        for trn in self.ledger:
-            trn.verify()
-            as_flow.add_edge(Vertex(trn.src), (Vertex(trn.dest), trn.amount))
-
-        return as_flow
+        # build flow graph with nodes
+        return flow.FlowGraph.from_edges(
+            ((nodes[trn.src], nodes[trn.dest], trn.amount) for trn in self.ledger),
+            self.nodes,
+        )
 
     def _flow_to_transactions(self, fg: flow.FlowGraph) -> list[Transaction]:
         """For each edge, make a transaction"""
@@ -111,15 +136,50 @@ class Ledger:
 
         return new_trns
 
-    def simplify_ledger(self):
+    def simplify_ledger(
+        self,
+        *,
+        mode: str = "max_flow",
+        compact: bool = False,
+        algorithm: str = "edmonds_karp",
+        thresholds: src.simplify.flow_algorithms.engine_thresholds | None = None,
+        split: bool = False,
+        workers: int | None = None,
+        render: bool = False,
+        instrument: bool = False,
+    ):
+        """Simplifies the ledger in place;
+        mode is how to settle, one of Simplify.modes (see Simplify.settle),
+        compact = True packs the flow graph into arrays before settling, where
+        edmonds_karp and cycle cancelling run without an object per edge (large groups),
+        algorithm picks the max flow engine used (see MaxFlow.engine, or "auto"),
+        thresholds picks it by group size for "auto" (see MaxFlow.engine_for),
+        split = True settles unconnected clusters of people separately,
+        across `workers` processes if given; workers also caps the processes
+        signatures are checked across (workers = 1 keeps everything in this one),
+        render = True draws the graph before and after, in the background,
+        instrument = True keeps counts of what settling did in self.stats"""
         # build ledger as a flow graph
-        fg = self._as_flow()
-        fg.to_dot(title="pre_settle")
+        fg = self._as_flow(workers=workers)
+        if compact:
+            fg = CSRFlowGraph.from_graph(fg)
+        if render:
+            renders.default_queue().submit(fg, title="pre_settle")
         try:
-            simplified_fg = Simplify.simplify_debt(fg)
+            simplified_fg = Simplify.settle(
+                fg,
+                mode=mode,
+                algorithm=algorithm,
+                thresholds=thresholds,
+                split=split,
+                workers=workers,
+                instrument=instrument,
+            )
+            self.stats = simplified_fg.stats
 
             # settle, update ledger
-            simplified_fg.to_dot(title="settled")
+            if render:
+                renders.default_queue().submit(simplified_fg, title="settled")
             self.ledger = self._flow_to_transactions(simplified_fg)
 
         except SettleError:
@@ -139,29 +199,332 @@ class Ledger:
             raise ve
 
 
+@dataclass(eq=False)
+class StreamingLedger(Ledger):
+    """Ledger that verifies transactions as they come in and folds them straight
+    into its flow graph, keeping none of them; only debts between pairs of people
+    and everyone's keys are held, so memory grows with the size of the group
+    rather than with its history.
+
+    Fed from any iterable of transactions, e.g. rows off a DB cursor or CSV reader
+    (see from_stream). Once settled, .ledger holds the settled transactions"""
+
+    graph: flow.FlowGraph = field(default_factory=lambda: flow.FlowGraph([]))
+    # how many transactions have been folded in
+    transactions: int = 0
+
+    @classmethod
+    def from_stream(cls, transactions: Iterable[Transaction]) -> "StreamingLedger":
+        ledger = cls()
+        ledger.extend(transactions)
+        return ledger
+
+    def __bool__(self):
+        """False if nothing has been folded in"""
+        return not not self.transactions
+
+    def __eq__(self, other):
+        if not isinstance(other, StreamingLedger):
+            return NotImplemented
+        return self.graph == other.graph
+
+    def append(self, transaction: Transaction) -> list[Transaction]:
+        """Verifies transaction and adds its debt to the graph;
+        raises VerificationError if it isn't properly signed"""
+
+        if type(transaction) is not Transaction:
+            raise LedgerBuildError(
+                f"cannot append type {transaction} to ledger; must be transaction"
+            )
+
+        transaction.verify()
+
+        src, dest = Vertex(transaction.src), Vertex(transaction.dest)
+        for node in src, dest:
+            if not self.graph.is_node(node):
+                self.graph.add_node(node)
+
+        if transaction.amount:
+            self.graph.add_edge(src, (dest, transaction.amount))
+
+        self.key_map[transaction.src] = transaction.src_pub
+        self.key_map[transaction.dest] = transaction.dest_pub
+        self.transactions += 1
+
+        return self.ledger
+
+    def extend(self, transactions: Iterable[Transaction]) -> None:
+        """Folds in every transaction of an iterable, one at a time"""
+        for transaction in transactions:
+            self.append(transaction)
+
+    def balances(self) -> dict[int, int]:
+        return {
+            node.ID: self.graph.net_debt[node]
+            for node in sorted(self.graph.nodes(), key=lambda node: node.ID)
+        }
+
+    def _verify_transactions(self, *, workers: int | None = None) -> None:
+        """Transactions are verified as they are appended"""
+
+    def _as_flow(self, *, workers: int | None = None) -> flow.FlowGraph:
+        """Copy of the folded graph, for settling to use up; nodes in ID order,
+        as Ledger._as_flow has them"""
+        self.nodes = sorted(self.graph.nodes(), key=lambda node: node.ID)
+
+        graph = self.graph.clone()
+        graph.graph = {node: graph.graph[node] for node in self.nodes}
+        graph.net_debt = {node: graph.net_debt[node] for node in self.nodes}
+
+        return graph
+
+
+@dataclass
+class Settlement:
+    """Simplified debt of one group, kept between settles.
+
+    New transactions are absorbed into the already simplified graph, and only the
+    people they are between get looked at again when settling (Simplify.simplify_around),
+    so settling costs scale with the new transactions rather than the group's history"""
+
+    graph: flow.FlowGraph = field(default_factory=lambda: flow.FlowGraph([]))
+    key_map: dict[int, keys.any_public_key] = field(default_factory=lambda: {})
+
+    # IDs of transactions the graph accounts for
+    absorbed: set[int] = field(default_factory=lambda: set())
+    touched: set[Vertex] = field(default_factory=lambda: set())
+
+    # IDs of settling transactions already in the graph, but not yet signed;
+    # checked as they are absorbed
+    pending: set[int] = field(default_factory=lambda: set())
+
+    # number of transactions the graph stands for; settling has to beat this
+    open: int = 0
+
+    def absorb(self, transaction: Transaction, *, verify: bool = True) -> None:
+        """Verifies a transaction (unless it already has been, see absorb_all) and
+        adds it to the graph; already absorbed IDs are skipped"""
+        if transaction.ID in self.absorbed:
+            return
+
+        if verify:
+            transaction.verify()
+
+        if transaction.ID in self.pending:
+            # its debt is in the graph already
+            self.pending.discard(transaction.ID)
+            self.absorbed.add(transaction.ID)
+            return
+
+        src, dest = Vertex(transaction.src), Vertex(transaction.dest)
+        for node in src, dest:
+            if not self.graph.is_node(node):
+                self.graph.add_node(node)
+
+        self.graph.add_edge(src, (dest, transaction.amount))
+
+        self.key_map[transaction.src] = transaction.src_pub
+        self.key_map[transaction.dest] = transaction.dest_pub
+
+        self.absorbed.add(transaction.ID)
+        self.touched |= {src, dest}
+        self.open += 1
+
+    def absorb_all(
+        self, transactions: Iterable[Transaction], *, workers: int | None = None
+    ) -> None:
+        """Absorbs every transaction not already absorbed, checking them together as
+        one batch (see transaction.verify_batch); if any fail, none are absorbed"""
+        new = [trn for trn in transactions if trn.ID not in self.absorbed]
+
+        results = verify_batch(new, workers=workers)
+        if not all(results):
+            failed = [trn.ID for trn, valid in zip(new, results) if not valid]
+            raise VerificationError(f"Transactions {failed} failed verification")
+
+        for trn in new:
+            self.absorb(trn, verify=False)
+
+    def settle(
+        self,
+        *,
+        algorithm: str = "edmonds_karp",
+        thresholds: src.simplify.flow_algorithms.engine_thresholds | None = None,
+    ) -> list[Transaction]:
+        """Simplifies around everyone touched since the last settle (algorithm and
+        thresholds as for Simplify.simplify_debt); returns the (unsigned)
+        transactions that now settle the group"""
+        Simplify.simplify_around(
+            self.graph, self.touched, algorithm=algorithm, thresholds=thresholds
+        )
+        self.touched = set()
+
+        if (transfers := Simplify.transfers(self.graph)) >= self.open:
+            raise NoFutherSimplifications(
+                "Graph already at few transactions per person; no optimisations found"
+            )
+
+        self.open = transfers
+
+        return Ledger(key_map=self.key_map)._flow_to_transactions(self.graph)
+
+    def pushed(self, IDs: set[int]) -> None:
+        """The graph now stands for these (settling) transactions, in place of
+        everything absorbed; they still need checking once they're signed"""
+        self.absorbed = set()
+        self.pending = set(IDs)
+
+    def accounts_for(self) -> set[int]:
+        """IDs of every transaction the graph stands for"""
+        return self.absorbed | self.pending
+
+
+@dataclass
+class BatchResult:
+    """Outcome of settling one ledger of a batch (see LedgerLoader.simplify_all)"""
+
+    index: int  # where the ledger came in the batch
+    ledger: Ledger  # settled if error is None, otherwise as it was
+    error: Exception | None = None
+
+
+def _simplify_one(job: tuple[int, Ledger, float | None, dict]) -> BatchResult:
+    """Settles one ledger of a batch, giving up after timeout seconds, without
+    starting any processes of its own (it may be in a pool worker already).
+    Top level, so it can be sent to a process pool"""
+    index, ledger, timeout, options = job
+    options = {**options, "workers": 1}
+
+    def expire(signum, frame):
+        raise TimeoutError(f"Group took over {timeout}s to settle")
+
+    # SIGALRM only exists on unix, and can only be handled on the main thread (as
+    # in pool workers); anywhere else the group is settled without a time limit
+    timer = timeout
+    if timer is not None and not (
+        hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    ):
+        logger.warning(
+            "can't time out group %s here (needs SIGALRM, on the main thread); "
+            "settling it without its %ss limit",
+            index,
+            timer,
+        )
+        timer = None
+
+    if timer is not None:
+        previous = signal.signal(signal.SIGALRM, expire)
+
+    try:
+        try:
+            if timer is not None:
+                signal.setitimer(signal.ITIMER_REAL, timer)
+            ledger.simplify_ledger(**options)
+        finally:
+            # stop the clock before anything else, so it can't go off after the
+            # group is done; an alarm that beat this is caught below
+            if timer is not None:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        return BatchResult(index, ledger)
+    except Exception as e:
+        # NoFutherSimplifications, VerificationError, TimeoutError, but equally a
+        # malformed ledger; only this group fails
+        return BatchResult(index, ledger, e)
+    finally:
+        if timer is not None:
+            signal.signal(signal.SIGALRM, previous)
+
+
 class LedgerLoader:
     @staticmethod
-    def load_from_csv(path: str) -> list[Ledger]:
-        """Load from a csv, in transaction format"""
+    def simplify_all(
+        ledgers: Iterable[Ledger],
+        *,
+        workers: int | None = None,
+        max_pending: int | None = None,
+        timeout: float | None = None,
+        **options,
+    ) -> Iterator[BatchResult]:
+        """Settles many ledgers (e.g. one per group, from load_from_csv) across a
+        process pool, yielding a BatchResult for each as it finishes.
+
+        At most max_pending ledgers (default 2 per worker) are handed out at once,
+        so ledgers can be a generator of any length. A group taking more than
+        timeout seconds is abandoned with a TimeoutError (unix only, and only when
+        run on the main thread or in workers; otherwise a warning is logged and the
+        group runs to the end). Groups that can't be settled, for whatever reason,
+        come back with their error rather than stopping the batch; if a worker dies,
+        the groups the pool had in hand come back with a BrokenProcessPool, and the
+        rest carry on in a new pool.
+        options are passed on to Ledger.simplify_ledger, with its workers set to 1
+        so pool workers don't start pools of their own; workers = None settles
+        one at a time in this process"""
+
+        jobs = (
+            (index, ledger, timeout, options) for index, ledger in enumerate(ledgers)
+        )
+
+        if workers is None or workers < 2:
+            yield from map(_simplify_one, jobs)
+            return
+
+        if max_pending is None:
+            max_pending = 2 * workers
+
+        # job of each unfinished future
+        pending: dict[Future, tuple[int, Ledger, float | None, dict]] = {}
+
+        def finished(done: set[Future]) -> Iterator[BatchResult]:
+            for future in done:
+                index, ledger, _, _ = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    # the group never got settled: its worker died (BrokenProcessPool,
+                    # e.g. killed for memory) or it couldn't be sent to one
+                    yield BatchResult(index, ledger, e)
 
-        print("loading from csv")
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            for job in jobs:
+                try:
+                    future = pool.submit(_simplify_one, job)
+                except BrokenProcessPool:
+                    # a worker died; the rest of the batch goes to a fresh pool
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                    future = pool.submit(_simplify_one, job)
+                pending[future] = job
+
+                # hold off on handing out more until something finishes
+                while len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from finished(done)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finished(done)
+        finally:
+            pool.shutdown()
+
+    @staticmethod
+    def read_csv(path: str) -> Iterator[tuple[int, Transaction]]:
+        """(group, transaction) for each row of a csv in transaction format, read one
+        row at a time; e.g. to feed a StreamingLedger without loading the whole file"""
 
         def get_field(str_: str) -> int:
             return header.index(str_)
 
-        def build_trn() -> tuple[
-            int, int, int, keys.RSAPublicKey, keys.RSAPublicKey, int
-        ]:
-
-            ldr = keys.RSAKeyLoaderFromNumbers()
-            ldr.load(n=int(row[get_field("src_n")]), e=int(row[get_field("src_e")]))  # type: ignore
-            src_pub: keys.RSAPublicKey = keys.RSAPublicKey(ldr)
+        def build_trn() -> tuple[int, int, int, keys.PublicKey, keys.PublicKey, int]:
 
-            ldr2 = keys.RSAKeyLoaderFromNumbers()
-            ldr2.load(n=int(row[get_field("dest_n")]), e=int(row[get_field("dest_e")]))  # type: ignore
-            dest_pub: keys.RSAPublicKey = keys.RSAPublicKey(ldr2)
-
-            print(src_pub, dest_pub, "---", sep="\n")
+            # one shared key object per person, however many rows they're in
+            src_pub = keys.registry.get(
+                int(row[get_field("src_n")]), int(row[get_field("src_e")])
+            )
+            dest_pub = keys.registry.get(
+                int(row[get_field("dest_n")]), int(row[get_field("dest_e")])
+            )
 
             return (
                 int(row[get_field("src")]),
@@ -177,9 +540,6 @@ class LedgerLoader:
                 f"File not found at current path: \n{os.getcwd()};\nsearched for {path}"
             )
 
-        transactions: list[list[Transaction]] = []
-
-        # generate transaction objects, store as list of groups of transactions
         with open(path) as csvfile:
             transaction_reader = csv.reader(csvfile, delimiter=",")
             for row in transaction_reader:
@@ -188,22 +548,30 @@ class LedgerLoader:
                     header: list[str] = row
                     continue
 
-                # build transaction, keep groups intact
+                yield int(row[get_field("group")]), Transaction(*build_trn())
 
-                trn = Transaction(*build_trn())
+    @staticmethod
+    def load_from_csv(path: str) -> list[Ledger]:
+        """Load from a csv, in transaction format"""
 
-                try:
-                    transactions[int(row[get_field("group")])].append(trn)
+        print("loading from csv")
+
+        transactions: list[list[Transaction]] = []
+
+        # store as list of groups of transactions
+        for group, trn in LedgerLoader.read_csv(path):
+            try:
+                transactions[group].append(trn)
 
-                except IndexError:
-                    # make position at group if not made yet (assuming consecutive 0 indexed group numbers
-                    transactions.append([trn])
+            except IndexError:
+                # make position at group if not made yet (assuming consecutive 0 indexed group numbers
+                transactions.append([trn])
 
         ledgers: list[Ledger] = []
 
-        for group in transactions:
+        for group_transactions in transactions:
             ledger = Ledger()
-            for trn in group:
+            for trn in group_transactions:
                 ledger.append(trn)
             ledgers.append(ledger)
 
@@ -9,8 +9,9 @@ import datetime
 import sys
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
+from typing import Sequence
 
-from src.crypto import keys, hashes, rsa
+from src.crypto import batch, cache, keys, hashes, rsa
 
 
 class TransactionError(Exception):
@@ -38,8 +39,8 @@ class Transaction(Signable):
     src: int
     dest: int
     amount: int
-    src_pub: keys.RSAPublicKey
-    dest_pub: keys.RSAPublicKey
+    src_pub: keys.any_public_key
+    dest_pub: keys.any_public_key
     ID: int = 0
     reference: str = ""
     time: datetime.datetime = datetime.datetime.now()
@@ -110,8 +111,9 @@ class Transaction(Signable):
             # if parameter wasn't src or dest, raise error
             raise ValueError(f"{origin!r} not a valid parameter; use 'src' or 'dest'")
 
-    def verify(self) -> None:
-        """Raise verification error if invalid sig"""
+    def checks(self) -> list[batch.check]:
+        """(hash, signature, n, e) for the src and dest signatures;
+        raises VerificationError if either is missing"""
 
         # ensure that transaction has its two signatures:
         try:
@@ -133,7 +135,39 @@ class Transaction(Signable):
             if type(val) is str:
                 self.signatures[s_key] = int(val, 16).to_bytes(256, sys.byteorder)
 
-        for key, origin in zip(usr_keys, [self.src, self.dest]):
-            hash_from_sig = rsa.RSA.inv_sig(self.signatures[origin], key)
-            if hash_from_sig != hash_from_obj:
+        return [
+            (hash_from_obj, self.signatures[origin], key.n, key.e)
+            for key, origin in zip(usr_keys, [self.src, self.dest])
+        ]
+
+    def verify(self) -> None:
+        """Raise verification error if invalid sig"""
+
+        # checked once per (hash, sig, key); see cache.VerificationCache
+        for check in self.checks():
+            if not cache.verifications.check(*check):
                 raise VerificationError(f"{self.src} sig invalid")
+
+
+def verify_batch(items: Sequence[Transaction | batch.check], **options) -> list[bool]:
+    """Pass / fail for each transaction (both signatures good) or (hash, sig, n, e),
+    checked together across a process pool; see batch.verify for options.
+    Unsigned transactions fail, rather than raising"""
+    # checks of each item, as a slice of all the checks; None if it has none
+    spans: list[slice | None] = []
+    checks: list[batch.check] = []
+
+    for item in items:
+        start = len(checks)
+        if isinstance(item, Transaction):
+            try:
+                checks += item.checks()
+            except VerificationError:
+                spans.append(None)
+                continue
+        else:
+            checks.append(item)
+        spans.append(slice(start, len(checks)))
+
+    results = batch.verify(checks, **options)
+    return [span is not None and all(results[span]) for span in spans]
@@ -0,0 +1,219 @@
+# coding=utf-8
+
+"""
+Times the simplifier on generated workloads, at a few sizes and shapes, and writes
+a JSON report. From the repo root:
+
+    python -m tests.benchmarks.bench_settle -o bench.json
+"""
+
+import argparse
+import dataclasses
+import datetime
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable
+
+from src.crypto import cache
+from src.simplify import stats
+from src.simplify.flow_algorithms import MaxFlow, NoOptimisations, Simplify
+from src.simplify.flow_graph import FlowGraph
+from src.transactions.ledger import Ledger, NoFutherSimplifications
+from tests.benchmarks.workload import Workload, sample_keys
+
+# (members, transactions); ledgers have to be signed up front, so are kept smaller
+GRAPH_SIZES = [(10, 50), (50, 500), (200, 2000)]
+LEDGER_SIZES = [(10, 50), (30, 200)]
+
+# shapes, each run at the middle graph size
+VARIANTS = [
+    {"amounts": "lognormal"},
+    {"amounts": "pareto"},
+    {"cycle_density": 0.0},
+    {"cycle_density": 0.5},
+    {"components": 5},
+]
+
+ENGINES = ["dinic", "push_relabel"]
+
+
+def timed(
+    run: Callable[[], object], setup: Callable[[], object], repeat: int
+) -> list[float]:
+    """Seconds taken by each of `repeat` calls of run(setup()); setup isn't timed"""
+    times = []
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        run(arg)  # type: ignore
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def simplify(graph: FlowGraph, algorithm: str = "edmonds_karp") -> None:
+    try:
+        Simplify.simplify_debt(graph, algorithm=algorithm)
+    except NoOptimisations:
+        pass
+
+
+def simplify_ledger(ledger: Ledger) -> None:
+    try:
+        ledger.simplify_ledger()
+    except NoFutherSimplifications:
+        pass
+
+
+def copy_ledger(ledger: Ledger) -> Ledger:
+    return Ledger(ledger=list(ledger.ledger), key_map=dict(ledger.key_map))
+
+
+def edmonds_karp(graph: FlowGraph) -> None:
+    """Max flow from the biggest debtor to the biggest creditor"""
+    src = max(graph.net_debt, key=graph.net_debt.__getitem__)
+    sink = min(graph.net_debt, key=graph.net_debt.__getitem__)
+    MaxFlow.edmonds_karp(graph, src, sink)
+
+
+def result(name: str, workload: Workload, times: list[float], **extra) -> dict:
+    return {
+        "benchmark": name,
+        **dataclasses.asdict(workload),
+        "repeat": len(times),
+        "times": times,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        **extra,
+    }
+
+
+def bench_graph(workload: Workload, repeat: int) -> list[dict]:
+    graph = workload.graph()
+
+    # one instrumented settle, for how much work the timings stand for
+    with stats.collect() as record:
+        simplify(graph.clone())
+    counts = dataclasses.asdict(record)
+    counts["max_flow_calls"] = record.max_flow_calls
+
+    return [
+        result("edmonds_karp", workload, timed(edmonds_karp, graph.clone, repeat)),
+        result(
+            "simplify_debt",
+            workload,
+            timed(simplify, graph.clone, repeat),
+            stats=counts,
+        ),
+        *(
+            # what MaxFlow.engine_for's defaults are picked from
+            result(
+                f"simplify_debt[{algorithm}]",
+                workload,
+                timed(lambda g: simplify(g, algorithm), graph.clone, repeat),
+            )
+            for algorithm in ENGINES
+        ),
+    ]
+
+
+def cold_ledger(ledger: Ledger) -> Ledger:
+    """Copy of ledger, with no signature checks cached from earlier runs"""
+    cache.verifications.clear()
+    return copy_ledger(ledger)
+
+
+def bench_ledger(workload: Workload, repeat: int, private) -> list[dict]:
+    ledger = workload.ledger(private)
+    return [
+        result(
+            "as_flow",
+            workload,
+            timed(Ledger._as_flow, lambda: cold_ledger(ledger), repeat),
+        ),
+        result(
+            "simplify_ledger",
+            workload,
+            timed(simplify_ledger, lambda: cold_ledger(ledger), repeat),
+        ),
+        # every signature already checked; what settling a group again costs
+        result(
+            "simplify_ledger[cached]",
+            workload,
+            timed(simplify_ledger, lambda: copy_ledger(ledger), repeat),
+        ),
+    ]
+
+
+def run(
+    *,
+    graph_sizes: list[tuple[int, int]] = GRAPH_SIZES,
+    ledger_sizes: list[tuple[int, int]] = LEDGER_SIZES,
+    variants: list[dict] = VARIANTS,
+    repeat: int = 3,
+    seed: int = 0,
+) -> dict:
+    """Runs every benchmark; returns the report"""
+    results = []
+
+    for members, transactions in graph_sizes:
+        workload = Workload(members, transactions, seed=seed)
+        results += bench_graph(workload, repeat)
+
+    if graph_sizes:
+        members, transactions = graph_sizes[len(graph_sizes) // 2]
+        for variant in variants:
+            workload = Workload(members, transactions, seed=seed, **variant)
+            results += bench_graph(workload, repeat)
+
+    private = sample_keys() if ledger_sizes else []
+    for members, transactions in ledger_sizes:
+        workload = Workload(members, transactions, seed=seed)
+        results += bench_ledger(workload, repeat, private)
+
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "results": results,
+    }
+
+
+def size(arg: str) -> tuple[int, int]:
+    members, transactions = arg.split("x")
+    return int(members), int(transactions)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-o", "--output", help="report file; default stdout")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument(
+        "--graph", type=size, nargs="*", help="graph sizes, as MEMBERSxTRANSACTIONS"
+    )
+    parser.add_argument(
+        "--ledger", type=size, nargs="*", help="ledger sizes, as MEMBERSxTRANSACTIONS"
+    )
+    args = parser.parse_args(argv)
+
+    report = run(
+        graph_sizes=GRAPH_SIZES if args.graph is None else args.graph,
+        ledger_sizes=LEDGER_SIZES if args.ledger is None else args.ledger,
+        repeat=args.repeat,
+        seed=args.seed,
+    )
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# coding=utf-8
+import json
+import os
+import pathlib
+from unittest import TestCase
+
+from tests.benchmarks import bench_settle
+from tests.benchmarks.workload import Workload, WorkloadError
+
+
+def setUpModule():
+    # sample keys are found from the repo root
+    os.chdir(pathlib.Path(__file__).parent.parent.parent)
+
+
+class TestWorkload(TestCase):
+    def test_seeded(self):
+        """Same workload, same rows; another seed, other rows"""
+        self.assertEqual(Workload().rows(), Workload().rows())
+        self.assertNotEqual(Workload().rows(), Workload(seed=1).rows())
+        self.assertEqual(len(Workload(transactions=37).rows()), 37)
+
+    def test_components(self):
+        """Nobody owes anyone outside of their component"""
+        workload = Workload(members=12, transactions=200, components=3)
+        component = {ID: n for n, group in enumerate(workload.groups()) for ID in group}
+
+        for src, dest, _ in workload.rows():
+            self.assertEqual(component[src], component[dest])
+
+    def test_cycles(self):
+        """Loops of debt cancel out of everyone's balance"""
+        # three members => every loop is three transactions long; none get cut short
+        loops = Workload(members=3, transactions=60, cycle_density=1.0)
+        chain = Workload(members=3, transactions=60, cycle_density=0.0)
+
+        self.assertFalse(any(loops.graph().net_debt.values()))
+        self.assertTrue(any(chain.graph().net_debt.values()))
+
+    def test_bad_workload(self):
+        for bad in [
+            {"amounts": "normal"},
+            {"members": 3, "components": 2},
+            {"cycle_density": 2},
+        ]:
+            with self.subTest(bad), self.assertRaises(WorkloadError):
+                Workload(**bad)
+
+    def test_ledger(self):
+        ledger = Workload(members=4, transactions=5).ledger()
+
+        self.assertEqual(len(ledger.ledger), 5)
+        ledger._verify_transactions()
+
+    def test_report(self):
+        """A tiny run gives a JSON report with a result per benchmark"""
+        report = bench_settle.run(
+            graph_sizes=[(6, 20)], ledger_sizes=[(4, 5)], variants=[], repeat=1
+        )
+
+        results = json.loads(json.dumps(report))["results"]
+
+        self.assertEqual(
+            [
+                "edmonds_karp",
+                "simplify_debt",
+                "simplify_debt[dinic]",
+                "simplify_debt[push_relabel]",
+                "as_flow",
+                "simplify_ledger",
+                "simplify_ledger[cached]",
+            ],
+            [result["benchmark"] for result in results],
+        )
@@ -0,0 +1,129 @@
+# coding=utf-8
+
+"""
+Seeded generator of debt graphs and ledgers for benchmarking the simplifier.
+The same Workload (seed included) always gives the same rows, graph and ledger
+"""
+
+import datetime
+import random
+from dataclasses import dataclass
+from typing import Callable
+
+from src.crypto import keys
+from src.simplify.flow_graph import FlowGraph
+from src.simplify.graph_objects import Vertex
+from src.transactions.ledger import Ledger
+from src.transactions.transaction import Transaction
+
+SAMPLE_KEYS = "./src/crypto/sample_keys/{}_private-key.pem"
+
+# signatures cover the time of a transaction, so keep it fixed for repeatable ledgers
+EPOCH = datetime.datetime(2022, 1, 1)
+
+
+class WorkloadError(Exception):
+    """Workload can't be generated as asked"""
+
+
+def sample_keys() -> list[keys.RSAPrivateKey]:
+    """The repo's sample d, m, t private keys; members take turns using them"""
+    private = []
+    for person in "dmt":
+        ldr = keys.RSAKeyLoader()
+        ldr.load(SAMPLE_KEYS.format(person))
+        ldr.parse()
+        private.append(keys.RSAPrivateKey(ldr))
+    return private
+
+
+@dataclass(frozen=True)
+class Workload:
+    """Shape of a group's debts.
+
+    members are split round robin into `components` groups that never owe each
+    other; cycle_density is the share of transactions that are part of a loop of
+    debt (3 to 5 people each owing the next the same amount)"""
+
+    members: int = 20
+    transactions: int = 100
+    amounts: str = "uniform"
+    cycle_density: float = 0.1
+    components: int = 1
+    seed: int = 0
+
+    # name: amount drawn from a random.Random; always at least 1
+    distributions = {
+        "uniform": lambda rng: rng.randint(1, 100),
+        "lognormal": lambda rng: max(1, round(rng.lognormvariate(3, 1))),
+        "pareto": lambda rng: max(1, round(10 * rng.paretovariate(1.5))),
+    }
+
+    def __post_init__(self):
+        if self.amounts not in self.distributions:
+            raise WorkloadError(
+                f"No amount distribution {self.amounts!r};"
+                f" use one of {tuple(self.distributions)}"
+            )
+        if self.members < 2 * self.components:
+            raise WorkloadError("Each component needs at least two members")
+        if not 0 <= self.cycle_density <= 1:
+            raise WorkloadError("cycle_density is a share; between 0 and 1")
+
+    def groups(self) -> list[list[int]]:
+        """Member IDs (from 1) of each component"""
+        return [
+            list(range(c + 1, self.members + 1, self.components))
+            for c in range(self.components)
+        ]
+
+    def rows(self) -> list[tuple[int, int, int]]:
+        """(src, dest, amount) of every transaction"""
+        rng = random.Random(self.seed)
+        amount: Callable[[random.Random], int] = self.distributions[self.amounts]
+        groups = self.groups()
+
+        rows: list[tuple[int, int, int]] = []
+        while len(rows) < self.transactions:
+            group = rng.choice(groups)
+
+            if len(group) >= 3 and rng.random() < self.cycle_density:
+                loop = rng.sample(group, rng.randint(3, min(5, len(group))))
+                owed = amount(rng)
+                rows += [(src, dest, owed) for src, dest in zip(loop, loop[1:] + loop)]
+            else:
+                src, dest = rng.sample(group, 2)
+                rows.append((src, dest, amount(rng)))
+
+        # a loop may run past the end; cut it short
+        return rows[: self.transactions]
+
+    def graph(self) -> FlowGraph:
+        """Debt graph of the workload, everyone in it, in ID order"""
+        nodes = [Vertex(ID) for ID in range(1, self.members + 1)]
+        return FlowGraph.from_edges(self.rows(), nodes)
+
+    def ledger(self, private: list[keys.RSAPrivateKey] | None = None) -> Ledger:
+        """Signed ledger of the workload. Members take turns with the keys in
+        private (default: sample_keys()); signing is slow, so keep these small"""
+        if private is None:
+            private = sample_keys()
+        public = [keys.RSAPublicKey(key) for key in private]
+
+        ledger = Ledger()
+        for n, (src, dest, amount) in enumerate(self.rows()):
+            trn = Transaction(
+                src,
+                dest,
+                amount,
+                public[src % len(public)],
+                public[dest % len(public)],
+                ID=n + 1,
+                reference=f"workload {self.seed}",
+                time=EPOCH,
+            )
+            trn.sign(private[src % len(private)], origin="src")
+            trn.sign(private[dest % len(private)], origin="dest")
+            ledger.append(trn)
+
+        return ledger
@@ -0,0 +1,65 @@
+# coding=utf-8
+
+"""
+Testing checking signatures in batches
+"""
+import os
+import pathlib
+from unittest import TestCase, mock
+
+from src.crypto import batch, cache, hashes, keys, rsa
+
+
+def setUpModule():
+    os.chdir(pathlib.Path(__file__).parent.parent.parent / "src")
+
+
+class TestBatch(TestCase):
+    def setUp(self) -> None:
+        ldr = keys.RSAKeyLoader()
+        ldr.load("./crypto/sample_keys/d_private-key.pem")
+        ldr.parse()
+        private = keys.RSAPrivateKey(ldr)
+        n, e = private.n, private.e
+
+        self.checks = []
+        for amount in range(6):
+            digest = hashes.Hasher(f"d owes m {amount}".encode()).digest().h
+            self.checks.append((digest, rsa.RSA.sign(digest, private), n, e))
+
+        # break the odd ones
+        for i in 1, 3, 5:
+            digest, sig, n, e = self.checks[i]
+            self.checks[i] = (digest, sig, n + 2, e)
+
+        self.expected = [True, False] * 3
+        self.cache = cache.VerificationCache()
+
+    def test_verify(self):
+        """A failure doesn't stop the rest being checked"""
+        self.assertEqual(
+            self.expected, batch.verify(self.checks, workers=1, cache=self.cache)
+        )
+
+    def test_cached(self):
+        batch.verify(self.checks, workers=1, cache=self.cache)
+        self.assertEqual(
+            self.expected, batch.verify(self.checks, workers=1, cache=self.cache)
+        )
+        self.assertEqual(self.cache.info(), cache.CacheInfo(6, 6, 6, 4096))
+
+    def test_grows_cache(self):
+        """A batch bigger than the cache makes room for all of its checks"""
+        small = cache.VerificationCache(maxsize=2)
+        batch.verify(self.checks, workers=1, cache=small)
+        batch.verify(self.checks, workers=1, cache=small)
+        self.assertEqual(small.info(), cache.CacheInfo(6, 6, 6, 6))
+
+    def test_parallel(self):
+        with mock.patch.object(batch, "parallel_threshold", 2):
+            results = batch.verify(self.checks, workers=2, chunksize=2, cache=None)
+        self.assertEqual(self.expected, results)
+
+    def test_not_a_key(self):
+        digest, sig, *_ = self.checks[0]
+        self.assertEqual([False], batch.verify([(digest, sig, 0, 0)], cache=None))
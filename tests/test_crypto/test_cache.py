@@ -0,0 +1,96 @@
+# coding=utf-8
+
+"""
+Testing the cache of signature checks
+"""
+import os
+import pathlib
+from unittest import TestCase
+
+from src.crypto import cache, hashes, keys, rsa
+
+
+def setUpModule():
+    os.chdir(pathlib.Path(__file__).parent.parent.parent / "src")
+
+
+class TestVerificationCache(TestCase):
+    def setUp(self) -> None:
+        ldr = keys.RSAKeyLoader()
+        ldr.load("./crypto/sample_keys/d_private-key.pem")
+        ldr.parse()
+
+        self.private = keys.RSAPrivateKey(ldr)
+        self.public = keys.RSAPublicKey(ldr)
+
+        self.digest = hashes.Hasher(b"d owes m 5").digest().h
+        self.sig = rsa.RSA.sign(self.digest, self.private)
+
+        self.cache = cache.VerificationCache(maxsize=2)
+
+    def test_verify(self):
+        with self.subTest("valid"):
+            self.assertTrue(self.cache.verify(self.digest, self.sig, self.public))
+        with self.subTest("other digest"):
+            other = hashes.Hasher(b"d owes m 50").digest().h
+            self.assertFalse(self.cache.verify(other, self.sig, self.public))
+
+    def test_trailing_zero(self):
+        """A hash ending in a zero byte verifies like any other"""
+        n, e = self.public.n, self.public.e
+        digest = self.digest[:-1] + b"\x00"
+
+        sig = rsa.RSA.sign(digest, self.private)
+        self.assertTrue(cache.check(digest, sig, n, e))
+        with self.subTest("undoes to more than a hash"):
+            self.assertFalse(cache.check(digest, self.sig[::-1], n, e))
+
+    def test_hits(self):
+        """Only the first check of a signature is a miss"""
+        for _ in range(3):
+            self.cache.verify(self.digest, self.sig, self.public)
+
+        self.assertEqual(self.cache.info(), cache.CacheInfo(2, 1, 1, 2))
+
+    def test_other_key(self):
+        """A different key is a miss, and gets checked for real"""
+        self.cache.verify(self.digest, self.sig, self.public)
+
+        other = keys.TestPubKey(self.public.n + 2, self.public.e)
+        self.assertFalse(self.cache.verify(self.digest, self.sig, other))
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_bounded(self):
+        """Least recently used result is dropped past maxsize"""
+        digests = [hashes.Hasher(bytes([n])).digest().h for n in range(3)]
+        for digest in digests:
+            self.cache.verify(digest, self.sig, self.public)
+
+        self.assertEqual(len(self.cache), 2)
+        self.cache.verify(digests[0], self.sig, self.public)
+        self.assertEqual(self.cache.misses, 4)
+
+        self.cache.clear()
+        self.assertEqual(self.cache.info(), cache.CacheInfo(0, 0, 0, 2))
+
+    def test_resize(self):
+        """Growing keeps every result; shrinking drops the oldest"""
+        digests = [hashes.Hasher(bytes([n])).digest().h for n in range(3)]
+        self.cache.reserve(3)
+        for digest in digests:
+            self.cache.verify(digest, self.sig, self.public)
+        self.assertEqual(len(self.cache), 3)
+
+        with self.subTest("reserve doesn't shrink"):
+            self.cache.reserve(1)
+            self.assertEqual(self.cache.maxsize, 3)
+
+        with self.subTest("reserve stops at the ceiling"):
+            self.cache.ceiling = 5
+            self.cache.reserve(100)
+            self.assertEqual(self.cache.maxsize, 5)
+
+        self.cache.resize(1)
+        self.assertEqual(len(self.cache), 1)
+        self.cache.verify(digests[2], self.sig, self.public)
+        self.assertEqual(self.cache.hits, 1)
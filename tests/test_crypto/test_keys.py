@@ -6,6 +6,8 @@ Unit tests for key handling
 
 import os
 import pathlib
+import pickle
+import tempfile
 from unittest import TestCase
 
 from src.crypto import keys
@@ -91,6 +93,57 @@ class TestRSAKeyLoading(TestCase):
         with self.assertRaises(keys.RSAParserError):
             self.loader.load("./crypto/sample_keys/d_public-key.pe")
 
+    def test_pkcs8(self):
+        """PKCS#8 wrapped keys give the same numbers as PKCS#1 ones"""
+        self.loader.load(self.key_path)
+        self.loader.parse()
+
+        pkcs8 = keys.RSAKeyLoader()
+        pkcs8.load("./crypto/sample_keys/d_private-key-pkcs8.pem")
+        pkcs8.parse()
+
+        self.assertEqual(self.loader.lookup, pkcs8.lookup)
+
+    def test_parse_text(self):
+        """Text given back by load() parses to the same numbers"""
+        text = self.loader.load(self.key_path)
+        self.loader.parse()
+
+        ldr = keys.RSAKeyLoader()
+        ldr.parse(text)
+        self.assertEqual(self.loader.lookup, ldr.lookup)
+
+    def test_public_key_file(self):
+        self.loader.load(self.key_path)
+        self.loader.parse()
+
+        ldr = keys.RSAKeyLoader()
+        ldr.load_public(self.pub_key_path)
+        ldr.parse()
+
+        self.assertEqual(
+            {"n": self.loader.lookup["n"], "e": self.loader.lookup["e"]}, ldr.lookup
+        )
+        with self.assertRaises(keys.RSAParserError):
+            ldr.load_public(self.key_path)
+
+    def test_not_pem(self):
+        """Files that aren't PEM at all, or are cut short"""
+        with open(self.key_path) as f:
+            pem = f.read()
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name, contents in [
+                ("not pem", "ssh-rsa AAAA"),
+                ("cut short", pem[:200] + "\n-----END RSA PRIVATE KEY-----\n"),
+            ]:
+                path = os.path.join(directory, "key.pem")
+                with open(path, "w") as f:
+                    f.write(contents)
+
+                with self.subTest(name), self.assertRaises(keys.RSAParserError):
+                    self.loader.load(path)
+
     def test_unparsed_key(self):
         """Check accessing attributes"""
         loader = self.loader
@@ -119,3 +172,48 @@ class TestRSAKeyLoading(TestCase):
 
         with self.subTest("deny access"), self.assertRaises(keys.RSAPublicKeyError):
             _ = pub_key.p
+
+
+class TestKeyRegistry(TestCase):
+    def setUp(self) -> None:
+        ldr = keys.RSAKeyLoader()
+        ldr.load("./crypto/sample_keys/d_private-key.pem")
+        ldr.parse()
+
+        self.private = keys.RSAPrivateKey(ldr)
+        self.registry = keys.KeyRegistry()
+
+    def test_shared(self):
+        """Same numbers, same key object"""
+        n, e = self.private.n, self.private.e
+        key = self.registry.get(n, e, key_id=1)
+
+        self.assertIs(key, self.registry.get(n, e))
+        self.assertIs(key, self.registry.from_hex(1, "not", "hex"))
+        self.assertIs(key, self.registry.from_hex(2, hex(n), hex(e)))
+        self.assertEqual(len(self.registry), 1)
+
+        self.assertEqual(key, keys.RSAPublicKey(self.private))
+        self.assertEqual(key.size, 256)
+
+    def test_unused_keys_dropped(self):
+        self.registry.get(self.private.n, self.private.e, key_id=1)
+
+        self.assertEqual(len(self.registry), 0)
+        self.assertIsNone(self.registry.by_id(1))
+
+    def test_immutable(self):
+        key = self.registry.get(self.private.n, self.private.e)
+
+        for change in [
+            lambda: setattr(key, "n", 3),
+            lambda: delattr(key, "e"),
+            lambda: setattr(key, "d", 3),
+        ]:
+            with self.subTest(), self.assertRaises(keys.RSAPublicKeyError):
+                change()
+
+    def test_pickle(self):
+        """Unpickles to the process' shared key"""
+        key = keys.registry.get(self.private.n, self.private.e)
+        self.assertIs(key, pickle.loads(pickle.dumps(key)))
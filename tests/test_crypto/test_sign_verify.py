@@ -3,13 +3,13 @@
 """
 Testing sign / verify through RSA working as expected
 """
+import hashlib
 import os
 import pathlib
 from unittest import TestCase
 
 from src.crypto import keys
 from src.crypto import rsa
-from src.transactions.transaction import Signable
 
 
 def setUpModule():
@@ -55,3 +55,34 @@ class TestRSA(TestCase):
         de_sign: bytes = rsa.RSA.inv_sig(sig, self.public)
 
         self.assertEqual(m_bytes, de_sign)
+
+    def test_trailing_zero(self):
+        """What was signed comes back whole, zero bytes at its end included,
+        given its length; signatures are as long as the key"""
+        m_bytes = b"maia\x00\x00"
+        sig = rsa.RSA.sign(m_bytes, self.private)
+
+        self.assertEqual(len(sig), rsa.RSA.size(self.public))
+        self.assertEqual(m_bytes, rsa.RSA.inv_sig(sig, self.public, len(m_bytes)))
+        self.assertEqual(b"maia", rsa.RSA.inv_sig(sig, self.public))
+
+    def test_crt_sign(self):
+        """Signing through the CRT gives the very same signature as without"""
+        m_bytes = " | maia".encode("utf8")
+        sig = rsa.RSA.sign(m_bytes, self.private)
+
+        # same key, but without its primes
+        ldr = keys.RSAKeyLoaderFromNumbers()
+        ldr.load(self.private.n, self.private.e, self.private.d)
+        plain = ldr.priv_key()
+
+        with self.subTest("crt"):
+            self.assertTrue(self.private.has_crt())
+            self.assertFalse(plain.has_crt())
+
+        with self.subTest("same signature"):
+            self.assertEqual(sig, rsa.RSA.sign(m_bytes, plain))
+            self.assertEqual(
+                hashlib.sha256(sig).hexdigest(),
+                "9d3ec5112c7bd38a74f1d266631de10335fb07d4d15333d8b3bd9f8e40d75d9b",
+            )
@@ -1,10 +1,11 @@
 # coding=utf-8
+import sys
 from unittest import TestCase
 
 from src.simplify.base_graph import Digraph
 from src.simplify.flow_graph import FlowGraph
 from src.simplify.graph_objects import Vertex
-from src.simplify.path import Path, prev_map, disc_map, BFSQueue
+from src.simplify.path import Path, prev_map, disc_map, BFSQueue, BFSWorkspace
 from src.simplify.weighted_digraph import WeightedDigraph
 
 
@@ -131,3 +132,43 @@ class TestPath(TestCase):
         with self.subTest("with initial value"):
             queue, disc, prev = Path.build_bfs_structs(self.flow_graph)
             self.assertEqual(queue, BFSQueue())
+
+    def test_long_path(self):
+        """Checks that a path much longer than the recursion limit can be found"""
+        vertices = [Vertex(ID) for ID in range(sys.getrecursionlimit() * 2)]
+        chain = Digraph(vertices)
+        for src, dest in zip(vertices, vertices[1:]):
+            chain.add_edge(src, dest)
+
+        path = Path.shortest_path(chain, vertices[0], vertices[-1], chain.neighbours)
+        self.assertEqual(vertices, path)
+
+    def test_workspace(self):
+        """Checks that a reused workspace gives the same paths as a fresh search"""
+        a, b, c, d, e, f = self.vertices
+        workspace = BFSWorkspace(self.g)
+
+        for src, sink, expected in [
+            (a, f, [a, c, e, f]),
+            (b, f, [b, d, f]),
+            (f, a, []),
+        ]:
+            with self.subTest(f"{src} -> {sink}"):
+                self.assertEqual(
+                    expected,
+                    Path.shortest_path(self.g, src, sink, self.g.neighbours, workspace),
+                )
+
+        with self.subTest("reset"):
+            workspace.reset()
+            self.assertFalse(any(workspace.discovered.values()))
+            self.assertFalse(any(workspace.previous.values()))
+
+    def test_queue(self):
+        """Checks queue is FIFO and doesn't hold a vertex twice"""
+        a, b, c, *_ = self.vertices
+        queue = BFSQueue(a, b)
+        queue.enqueue(a, c)
+
+        self.assertEqual([a, b, c], [queue.dequeue() for _ in range(3)])
+        self.assertTrue(queue.is_empty())
@@ -0,0 +1,200 @@
+# coding=utf-8
+import random
+from unittest import TestCase
+
+from src.simplify import stats
+from src.simplify.base_graph import GraphError
+from src.simplify.csr_graph import CSRFlowGraph
+from src.simplify.flow_algorithms import MaxFlow, NoOptimisations, Simplify
+from src.simplify.flow_graph import FlowGraph, FlowEdge
+from src.simplify.graph_objects import Vertex
+
+
+def edges(graph: FlowGraph) -> list[tuple[int, int, int]]:
+    """Real edges of a graph as sorted (src, dest, capacity) triples"""
+    return sorted(
+        (src.ID, edge.node.ID, edge.capacity)
+        for src, adj_list in graph.graph.items()
+        for edge in adj_list
+        if not edge.residual
+    )
+
+
+class TestCSRFlowGraph(TestCase):
+    def setUp(self) -> None:
+        self.nodes = [Vertex(n, label=chr(n + 97)) for n in range(5)]
+        a, b, c, d, e = self.nodes
+
+        self.flow_graph = FlowGraph(self.nodes)
+        self.flow_graph.add_edge(a, (b, 10), (c, 4))
+        self.flow_graph.add_edge(b, (c, 2), (d, 7))
+        self.flow_graph.add_edge(c, (d, 10))
+
+        self.graph = CSRFlowGraph.from_graph(self.flow_graph)
+
+    def test_from_graph(self):
+        """Packing a FlowGraph keeps edges, edge order and net debts"""
+        with self.subTest("edges"):
+            self.assertEqual(str(self.flow_graph), str(self.graph))
+        with self.subTest("net debt"):
+            self.assertEqual(self.flow_graph.net_debt, self.graph.net_debt)
+        with self.subTest("nodes"):
+            self.assertEqual(self.nodes, self.graph.nodes())
+
+    def test_get_edge(self):
+        a, b, *_ = self.nodes
+        with self.subTest("real"):
+            self.assertEqual(FlowEdge(a, b, 10), self.graph.get_edge(a, b))
+        with self.subTest("residual"):
+            self.assertEqual(FlowEdge(b, a, 0), self.graph.get_edge(b, a))
+
+    def test_is_edge(self):
+        a, b, c, d, e = self.nodes
+        self.assertTrue(self.graph.is_edge(a, b))
+        self.assertFalse(self.graph.is_edge(b, a))
+        self.assertTrue(self.graph.is_edge(b, a, residual=True))
+        self.assertFalse(self.graph.is_edge(a, e, residual=True))
+
+    def test_add_edge(self):
+        """Adding to, cancelling against and creating edges behaves like FlowGraph"""
+        a, b, c, d, e = self.nodes
+        cases = [(a, (b, 5)), (d, (b, 3)), (d, (b, 10)), (c, (a, 4)), (e, (a, 1))]
+
+        for src, edge in cases:
+            with self.subTest(f"{src} -> {edge[0]}"):
+                self.flow_graph.add_edge(src, edge)
+                self.graph.add_edge(src, edge)
+                self.assertEqual(str(self.flow_graph), str(self.graph))
+                self.assertEqual(self.flow_graph.net_debt, self.graph.net_debt)
+
+    def test_pop_edge(self):
+        a, b, *_ = self.nodes
+        self.graph.pop_edge(a, b, update_debt=True)
+
+        self.assertFalse(self.graph.is_edge(a, b))
+        self.assertFalse(self.graph.is_edge(b, a, residual=True))
+        self.assertEqual(self.graph.net_debt[a], 4)
+
+    def test_flow_neighbours(self):
+        """Residual edges become neighbours once flow is pushed"""
+        a, b, c, d, e = self.nodes
+        MaxFlow.augment_flow(self.graph, [a, b, d], 3)
+
+        self.assertEqual(
+            [d, c, a], [edge.node for edge in self.graph.flow_neighbours(b)]
+        )
+
+    def test_adjust_edges(self):
+        a, b, c, d, e = self.nodes
+        MaxFlow.augment_flow(self.graph, [a, c, d], 4)
+        self.graph.adjust_edges()
+
+        self.assertFalse(self.graph.is_edge(a, c))
+        self.assertEqual(FlowEdge(c, d, 6), self.graph.get_edge(c, d))
+        self.assertEqual(FlowEdge(d, c, 0), self.graph.get_edge(d, c))
+
+    def test_edmonds_karp(self):
+        a, b, c, d, e = self.nodes
+        self.assertEqual(
+            MaxFlow.edmonds_karp(self.flow_graph, a, d),
+            MaxFlow.edmonds_karp(self.graph, a, d),
+        )
+
+    def test_simplify_debt(self):
+        """Settling a packed graph gives the same settled graph"""
+        a, b, c, d, e = self.nodes
+        self.flow_graph.add_edge(d, (e, 3))
+        self.flow_graph.add_edge(e, (a, 6))
+        graph = CSRFlowGraph.from_graph(self.flow_graph)
+
+        clean = Simplify.simplify_debt(self.flow_graph)
+        packed_clean = Simplify.simplify_debt(graph)
+
+        self.assertEqual(edges(clean), edges(packed_clean))
+        self.assertEqual(graph.net_debt, packed_clean.net_debt)
+
+    def test_clone(self):
+        a, b, *_ = self.nodes
+        clone = self.graph.clone()
+        clone.pop_edge(a, b, update_debt=True)
+
+        self.assertTrue(self.graph.is_edge(a, b))
+        self.assertEqual(self.flow_graph.net_debt, self.graph.net_debt)
+        self.assertEqual(str(self.flow_graph), str(self.graph))
+
+    def test_balances(self):
+        a, b, *_ = self.nodes
+        self.graph.pop_edge(a, b, update_debt=True)
+        self.assertEqual(self.graph.balances(), list(self.graph.net_debt.values()))
+
+    def test_stale_edge(self):
+        """Edges handed out before arcs move can't be used"""
+        a, b, c, d, e = self.nodes
+        edge = self.graph.get_edge(a, b)
+
+        # a's row is full; it moves to make room
+        self.graph.add_edge(e, (a, 1))
+
+        with self.assertRaises(GraphError):
+            _ = edge.capacity
+        self.assertEqual(FlowEdge(a, b, 10), self.graph.get_edge(a, b))
+
+    def test_grow(self):
+        """Rows make room for new edges as they go, keeping FlowGraph's order"""
+        a, *others = self.nodes
+        graph = CSRFlowGraph(self.nodes)
+        flow_graph = FlowGraph(self.nodes)
+
+        for n in range(40):
+            edge = (others[n % len(others)], n + 1)
+            graph.add_edge(a, edge)
+            flow_graph.add_edge(a, edge)
+
+        self.assertEqual(str(flow_graph), str(graph))
+
+    def test_from_edges(self):
+        """Building straight into arrays packs the same graph as FlowGraph builds"""
+        a, b, c, d, e = self.nodes
+        rows = [(a, b, 5), (b, c, 3), (c, a, 4), (b, a, 7), (d, e, 1), (e, d, 1)]
+
+        graph = CSRFlowGraph.from_edges(rows, self.nodes)
+        flow_graph = FlowGraph.from_edges(rows, self.nodes)
+
+        with self.subTest("edges"):
+            self.assertEqual(str(flow_graph), str(graph))
+        with self.subTest("net debt"):
+            self.assertEqual(flow_graph.net_debt, graph.net_debt)
+        with self.subTest("twins"):
+            for src, dest in [(b, a), (a, b), (c, a), (a, c), (b, c)]:
+                self.assertEqual(graph.get_edge(dest, src).src, dest)
+
+
+class TestCSRSettle(TestCase):
+    def test_same_as_flow_graph(self):
+        """Settling on the arrays does exactly what settling a FlowGraph does"""
+        rng = random.Random(0)
+        nodes = [Vertex(n) for n in range(12)]
+
+        for run in range(10):
+            rows = [(*rng.sample(nodes, 2), rng.randint(1, 50)) for _ in range(60)]
+            results = []
+
+            for graph in FlowGraph.from_edges(rows, nodes), CSRFlowGraph.from_edges(
+                rows, nodes
+            ):
+                with stats.collect() as record:
+                    try:
+                        clean = edges(Simplify.simplify_debt(graph))
+                    except NoOptimisations:
+                        clean = []
+                results.append(
+                    (
+                        clean,
+                        record.augmenting_paths,
+                        record.bfs_visits,
+                        record.edges_adjusted,
+                    )
+                )
+
+            with self.subTest(run=run):
+                self.assertEqual(*results)
@@ -1,7 +1,9 @@
 # coding=utf-8
-from unittest import TestCase
+import random
+from unittest import TestCase, mock
 
-from src.simplify.flow_algorithms import NoOptimisations, MaxFlow, Simplify
+from src.simplify import stats
+from src.simplify.flow_algorithms import NoOptimisations, MaxFlow, Simplify, SettleError
 from src.simplify.flow_graph import *
 from src.simplify.graph_objects import Vertex
 
@@ -189,6 +191,27 @@ class TestFlowGraph(TestCase):
         self.assertFalse(self.graph.is_edge(a, b))
         self.assertEqual(self.graph.get_edge(b, a).capacity, 5)
 
+    def test_reversed_edge_net_debt(self):
+        """Checks that reversing an edge only counts the added debt once"""
+        a, b, c, d, e = self.graph.nodes()
+        self.graph.add_edge(a, (b, 5))
+        self.graph.add_edge(b, (a, 10))
+
+        self.assertEqual(self.graph.net_debt[a], -5)
+        self.assertEqual(self.graph.net_debt[b], 5)
+
+    def test_adjust_edges_after_pop(self):
+        """Checks that popping a saturated edge doesn't stop the rest of the list being adjusted"""
+        a, b, c, d, e = self.graph.nodes()
+        self.graph.add_edge(a, (b, 10), (c, 5))
+        self.graph.get_edge(a, b).push_flow(10)
+        self.graph.get_edge(a, c).push_flow(2)
+
+        self.graph.adjust_edges()
+
+        self.assertFalse(self.graph.is_edge(a, b))
+        self.assertEqual(self.graph.get_edge(a, c), FlowEdge(a, c, 3))
+
 
 class TestMaxFlow(TestCase):
     def setUp(self) -> None:
@@ -271,6 +294,98 @@ class TestMaxFlow(TestCase):
         max_flow = MaxFlow.edmonds_karp(tg, s, t)
         self.assertEqual(max_flow, 20)
 
+    def test_dinic(self):
+        """Checks that Dinic's algorithm agrees with edmonds-karp"""
+        labels = ["a", "b", "c", "d", "e", "f"]
+        vertices = [Vertex(ID, label=label) for ID, label in enumerate(labels)]
+        a, b, c, d, e, f = vertices
+
+        graph = FlowGraph(vertices)
+        graph.add_edge(a, (b, 10), (c, 10))
+        graph.add_edge(b, (d, 25))
+        graph.add_edge(c, (e, 25))
+        graph.add_edge(d, (f, 10))
+        graph.add_edge(e, (f, 10), (b, 6))
+
+        with self.subTest("max flow"):
+            self.assertEqual(20, MaxFlow.dinic(graph, a, f))
+
+        with self.subTest("flow conserved"):
+            for node in [b, c, d, e]:
+                through = sum(edge.flow for edge in graph[node] if not edge.residual)
+                into = sum(-edge.flow for edge in graph[node] if edge.residual)
+                self.assertEqual(into, through)
+
+        with self.subTest("small graph"):
+            a, b, c, d, *_ = self.graph.nodes()
+            self.assertEqual(2, MaxFlow.dinic(self.graph, a, d))
+
+    def test_push_relabel(self):
+        """Checks that push-relabel finds the max flow and leaves a valid flow behind"""
+        labels = ["a", "b", "c", "d", "e", "f"]
+        vertices = [Vertex(ID, label=label) for ID, label in enumerate(labels)]
+        a, b, c, d, e, f = vertices
+
+        graph = FlowGraph(vertices)
+        graph.add_edge(a, (b, 10), (c, 10))
+        graph.add_edge(b, (d, 25))
+        graph.add_edge(c, (e, 25))
+        graph.add_edge(d, (f, 10))
+        graph.add_edge(e, (f, 10), (b, 6))
+
+        with self.subTest("max flow"):
+            self.assertEqual(20, MaxFlow.push_relabel(graph, a, f))
+
+        with self.subTest("no excess left"):
+            for node in [b, c, d, e]:
+                self.assertEqual(0, sum(edge.flow for edge in graph[node]))
+
+        with self.subTest("small graph"):
+            a, b, c, d, *_ = self.graph.nodes()
+            self.assertEqual(2, MaxFlow.push_relabel(self.graph, a, d))
+
+    def test_engine(self):
+        """Checks max flow engines are looked up by name"""
+        self.assertEqual(MaxFlow.dinic, MaxFlow.engine("dinic"))
+        with self.assertRaises(SettleError):
+            MaxFlow.engine("ford_fulkerson")
+
+    def test_engine_for(self):
+        """Checks engines are picked by graph size"""
+        for size, engine in [
+            (3, MaxFlow.edmonds_karp),
+            (50, MaxFlow.dinic),
+            (500, MaxFlow.dinic),
+        ]:
+            with self.subTest(size):
+                self.assertEqual(engine, MaxFlow.engine_for(size))
+
+        self.assertEqual(
+            MaxFlow.push_relabel,
+            MaxFlow.engine_for(500, thresholds=(), default="push_relabel"),
+        )
+
+        with self.subTest("choose"):
+            self.assertEqual(MaxFlow.dinic, MaxFlow.choose("dinic", 3))
+            self.assertEqual(MaxFlow.edmonds_karp, MaxFlow.choose("auto", 3))
+            self.assertEqual(
+                MaxFlow.push_relabel,
+                MaxFlow.choose("auto", 3, thresholds=((5, "push_relabel"),)),
+            )
+
+    def test_stats(self):
+        """Edmonds-Karp counts paths and BFS visits, only while stats are collected"""
+        a, b, c, d = self.graph.nodes()
+
+        with stats.collect() as record:
+            MaxFlow.edmonds_karp(self.graph, a, c)
+
+        self.assertEqual(record.augmenting_paths, 1)
+        # a, b, c to find a -> b -> c; then a, b before running out of paths
+        self.assertEqual(record.bfs_visits, 5)
+        self.assertEqual(record.max_flow_calls, 1)
+        self.assertIsNone(stats.active())
+
     def test_old_edmonds(self):
         """Tests a more complex graph for correct maxflow"""
         labels = ["a", "b", "c", "d", "e", "f"]
@@ -321,6 +436,78 @@ class TestSimplify(TestCase):  # type: ignore
         clean.to_dot(n=1)
         self.assertEqual(debt.net_debt, clean.net_debt)
 
+    def test_simplify_dinic(self):
+        """Checks that settling with Dinic's algorithm keeps everyone's balance"""
+        people = ["dad", "tom", "maia"]
+        debt = FlowGraph([Vertex(ID, person) for ID, person in enumerate(people)])
+        d, t, m = debt.nodes()
+        debt.add_edge(d, (t, 10), (m, 5))
+        debt.add_edge(m, (t, 5))
+
+        dinic = Simplify.simplify_debt(debt, algorithm="dinic")
+        self.assertEqual(debt.net_debt, dinic.net_debt)
+        self.assertEqual(dinic[d], [FlowEdge(d, t, 15)])
+
+    def test_simplify_thresholds(self):
+        """Checks "auto" picks engines by the thresholds passed to settle"""
+        people = ["dad", "tom", "maia"]
+        debt = FlowGraph([Vertex(ID, person) for ID, person in enumerate(people)])
+        d, t, m = debt.nodes()
+        debt.add_edge(d, (t, 10), (m, 5))
+        debt.add_edge(m, (t, 5))
+
+        with mock.patch.object(
+            MaxFlow, "push_relabel", wraps=MaxFlow.push_relabel
+        ) as push_relabel:
+            clean = Simplify.settle(
+                debt, algorithm="auto", thresholds=((3, "push_relabel"),)
+            )
+
+        self.assertTrue(push_relabel.called)
+        self.assertEqual(clean[d], [FlowEdge(d, t, 15)])
+
+    def test_engines_agree(self):
+        """Checks every engine settles random graphs to the same balances,
+        using only edges that were in the debt graph"""
+        rng = random.Random(0)
+        nodes = [Vertex(n) for n in range(10)]
+
+        for run in range(20):
+            rows = [(*rng.sample(nodes, 2), rng.randint(1, 50)) for _ in range(40)]
+            debt = FlowGraph.from_edges(rows, nodes)
+            pairs = {
+                frozenset((edge.src, edge.node))
+                for adj_list in debt.graph.values()
+                for edge in adj_list
+            }
+
+            for algorithm in ["edmonds_karp", "dinic", "push_relabel"]:
+                with self.subTest(run=run, algorithm=algorithm):
+                    try:
+                        clean = Simplify.simplify_debt(
+                            debt.clone(), algorithm=algorithm
+                        )
+                    except NoOptimisations:
+                        continue
+
+                    self.assertEqual(debt.balances(), clean.balances())
+                    self.assertLessEqual(
+                        {
+                            frozenset((edge.src, edge.node))
+                            for adj_list in clean.graph.values()
+                            for edge in adj_list
+                        },
+                        pairs,
+                    )
+
+    def test_simplify_push_relabel(self):
+        """Checks that settling with push-relabel doesn't create or destroy debt"""
+        d, m, t = self.graph.nodes()
+
+        clean = Simplify.simplify_debt(self.graph, algorithm="push_relabel")
+        self.assertEqual(self.graph.net_debt, clean.net_debt)
+        self.assertEqual(clean[d], [FlowEdge(d, t, 15)])
+
     def test_adjust_edges(self):
 
         """Checks that edges are adjusted accordingly, generate graphs before and after"""
@@ -362,7 +549,12 @@ class TestSimplify(TestCase):  # type: ignore
 
         messy.to_dot()
 
-        clean = Simplify.simplify_debt(messy)
+        # max flow moves the same debts around without cutting any out;
+        # the edges settled on are the ones put in, just in a different order
+        with self.assertRaises(NoOptimisations):
+            Simplify.simplify_debt(messy)
+
+        clean = Simplify.settle(messy, mode="greedy")
         clean.to_dot(n=1)
 
         self.assertEqual(messy.net_debt, clean.net_debt)
@@ -380,3 +572,217 @@ class TestSimplify(TestCase):  # type: ignore
         with self.assertRaises(NoOptimisations):
             clean = Simplify.simplify_debt(debt)
             clean.to_dot(n=1)
+
+    def test_greedy_settle(self):
+        """Greedy settling pays off net balances in fewer transfers"""
+        clean = Simplify.greedy_settle(self.graph)
+        d, m, t = self.graph.nodes()
+
+        self.assertEqual(self.graph.net_debt, clean.net_debt)
+        self.assertEqual(Simplify.transfers(clean), 1)
+        self.assertEqual(clean[d], [FlowEdge(d, t, 15)])
+
+    def test_greedy_simplest_graph(self):
+        """A chain between three people can't be settled in fewer than two transfers"""
+        people = ["dad", "tom", "maia"]
+        debt = FlowGraph([Vertex(ID, person) for ID, person in enumerate(people)])
+        d, t, m = debt.nodes()
+        debt.add_edge(d, (t, 5))
+        debt.add_edge(t, (m, 10))
+
+        with self.assertRaises(NoOptimisations):
+            Simplify.greedy_settle(debt)
+
+    def test_settle(self):
+        with self.subTest("max flow"):
+            clean = Simplify.settle(self.graph)
+            self.assertEqual(self.graph.net_debt, clean.net_debt)
+        with self.subTest("unknown mode"):
+            with self.assertRaises(SettleError):
+                Simplify.settle(self.graph, mode="magic")
+
+    def test_exact_settle(self):
+        """d +8, e +6 against a -4, b -4, c -6 splits into {d, a, b} and {e, c}, so
+        settles in three transfers; greedy pays the biggest first and needs four"""
+        people = [Vertex(ID, label=person) for ID, person in enumerate("abcde")]
+        a, b, c, d, e = people
+
+        debt = FlowGraph(people)
+        debt.add_edge(e, (d, 5), (c, 1))
+        debt.add_edge(d, (a, 4), (c, 9))
+        debt.add_edge(c, (b, 4))
+
+        exact = Simplify.exact_settle(debt)
+
+        self.assertEqual(debt.net_debt, exact.net_debt)
+        self.assertEqual(Simplify.transfers(exact), 3)
+        self.assertEqual(Simplify.transfers(Simplify.greedy_settle(debt)), 4)
+
+    def test_exact_simplest_graph(self):
+        people = ["dad", "tom", "maia"]
+        debt = FlowGraph([Vertex(ID, person) for ID, person in enumerate(people)])
+        d, t, m = debt.nodes()
+        debt.add_edge(d, (t, 5))
+        debt.add_edge(t, (m, 10))
+
+        with self.assertRaises(NoOptimisations):
+            Simplify.exact_settle(debt)
+
+    def test_exact_limit(self):
+        """Groups over the limit fall back on simplify_debt"""
+        fallback = Simplify.simplify_debt(self.graph.clone())
+        exact = Simplify.settle(self.graph, mode="exact", exact_limit=1)
+
+        self.assertEqual(fallback, exact)
+
+    def test_simplify_around(self):
+        """Only edges at touched nodes are rerouted; net debt is left alone"""
+        d, m, t = self.graph.nodes()
+        net_debt = dict(self.graph.net_debt)
+
+        with self.subTest("untouched"):
+            Simplify.simplify_around(self.graph, set())
+            self.assertEqual(Simplify.transfers(self.graph), 3)
+
+        with self.subTest("touched"):
+            Simplify.simplify_around(self.graph, {t})
+            self.assertEqual(self.graph[d], [FlowEdge(d, t, 15)])
+            self.assertEqual(net_debt, self.graph.net_debt)
+
+    def test_fingerprint(self):
+        """Graphs with the same debts are equal whatever order they were built in"""
+        d, m, t = self.graph.nodes()
+        other = FlowGraph([d, m, t])
+        other.add_edge(m, (t, 5))
+        other.add_edge(d, (t, 10), (m, 5))
+
+        with self.subTest("order"):
+            self.assertNotEqual(str(self.graph), str(other))
+            self.assertEqual(self.graph, other)
+            self.assertEqual(hash(self.graph.fingerprint()), hash(other.fingerprint()))
+        with self.subTest("capacity"):
+            other.add_edge(d, (t, 1))
+            self.assertNotEqual(self.graph, other)
+
+    def test_clone(self):
+        """Settling a clone leaves the original alone"""
+        d, m, t = self.graph.nodes()
+        clone = self.graph.clone()
+
+        self.assertEqual(self.graph, clone)
+        self.assertEqual(self.graph.net_debt, clone.net_debt)
+
+        Simplify.simplify_debt(clone)
+        self.assertFalse(clone)
+        self.assertEqual(Simplify.transfers(self.graph), 3)
+        self.assertEqual(self.graph.get_edge(t, d), FlowEdge(t, d, 0))
+
+    def test_from_edges(self):
+        """Bulk building gives the same debts as adding edges one by one"""
+        d, m, t = self.graph.nodes()
+        rows = [(d, m, 5), (d, t, 10), (m, t, 5), (t, d, 3), (m, d, 5)]
+
+        graph = FlowGraph([d, m, t])
+        for src, dest, amount in rows:
+            graph.add_edge(src, (dest, amount))
+
+        built = FlowGraph.from_edges(row for row in rows)
+
+        with self.subTest("edges"):
+            self.assertEqual(graph, built)
+            self.assertEqual(built[d], [FlowEdge(d, t, 7)])
+        with self.subTest("net debt"):
+            self.assertEqual(graph.net_debt, built.net_debt)
+        with self.subTest("residuals"):
+            self.assertEqual(built.get_edge(t, d), FlowEdge(t, d, 0))
+        with self.subTest("IDs"):
+            from_ids = FlowGraph.from_edges([(0, "2", "7"), (1, 2, 5)])
+            self.assertEqual(from_ids[Vertex(0)], [FlowEdge(Vertex(0), Vertex(2), 7)])
+
+    def test_from_edges_order(self):
+        """Bulk building leaves edges in the same order as adding them one by one"""
+        rng = random.Random(0)
+        nodes = [Vertex(n) for n in range(6)]
+
+        for run in range(20):
+            # small amounts, so edges get paid off exactly as well as overpaid
+            rows = [(*rng.sample(nodes, 2), rng.randint(1, 6)) for _ in range(40)]
+
+            graph = FlowGraph(nodes)
+            for src, dest, amount in rows:
+                graph.add_edge(src, (dest, amount))
+
+            with self.subTest(run=run):
+                self.assertEqual(str(graph), str(FlowGraph.from_edges(rows, nodes)))
+
+    def test_balances(self):
+        """Balances worked out from edges match the net debts kept by add_edge"""
+        d, m, t = self.graph.nodes()
+        self.assertEqual(self.graph.balances(), [15, 0, -15])
+        self.assertEqual(
+            self.graph.balances(), [self.graph.net_debt[n] for n in (d, m, t)]
+        )
+
+    def test_components(self):
+        """Two groups that never owe each other are split apart, and settle the same
+        apart as together"""
+        d, m, t = self.graph.nodes()
+        a, b, c, e = [Vertex(ID) for ID in range(3, 7)]
+
+        debt = FlowGraph([d, m, t, a, b, c, e])
+        debt.add_edge(d, (m, 5), (t, 10))
+        debt.add_edge(m, (t, 5))
+        debt.add_edge(a, (b, 2), (c, 4))
+        debt.add_edge(b, (c, 2))
+
+        components = Simplify.components(debt)
+        with self.subTest("split"):
+            self.assertEqual([g.nodes() for g in components], [[d, m, t], [a, b, c]])
+
+        with self.subTest("settle"):
+            clean = Simplify.settle(debt.clone(), split=True)
+            self.assertEqual(clean.nodes(), debt.nodes())
+            self.assertEqual(clean, Simplify.settle(debt.clone()))
+            self.assertEqual(debt.net_debt, clean.net_debt)
+
+        with self.subTest("parallel"):
+            clean = Simplify.settle(debt, mode="greedy", split=True, workers=2)
+            self.assertEqual(Simplify.transfers(clean), 2)
+            self.assertEqual(debt.net_debt, clean.net_debt)
+
+    def test_settle_stats(self):
+        """Instrumented settles hand back stats on the settled graph"""
+        with self.subTest("off"):
+            self.assertIsNone(Simplify.settle(self.graph.clone()).stats)
+
+        clean = Simplify.settle(self.graph.clone(), instrument=True)
+        record = clean.stats
+        with self.subTest("on"):
+            self.assertGreater(record.augmenting_paths, 0)
+            self.assertGreaterEqual(record.bfs_visits, record.augmenting_paths)
+            self.assertGreater(record.edges_adjusted, 0)
+            self.assertGreater(record.max_flow_time, 0)
+
+        with self.subTest("split"):
+            split = Simplify.settle(self.graph.clone(), split=True, instrument=True)
+            self.assertEqual(record.augmenting_paths, split.stats.augmenting_paths)
+            self.assertEqual(record.max_flow_calls, split.stats.max_flow_calls)
+
+    def test_cancel_cycles(self):
+        """Loops of debt are cancelled down by their smallest edge"""
+        a, b, c = [Vertex(ID, label=label) for ID, label in enumerate("abc")]
+        loop = FlowGraph([a, b, c])
+        loop.add_edge(a, (b, 5))
+        loop.add_edge(b, (c, 3))
+        loop.add_edge(c, (a, 4))
+        net_debt = dict(loop.net_debt)
+
+        self.assertEqual(Simplify.cancel_cycles(loop), 1)
+        self.assertEqual(loop.get_edge(a, b), FlowEdge(a, b, 2))
+        self.assertEqual(loop.get_edge(c, a), FlowEdge(c, a, 1))
+        self.assertFalse(loop.is_edge(b, c, residual=True))
+        self.assertEqual(net_debt, loop.net_debt)
+        self.assertEqual(loop.balances(), [1, -2, 1])
+
+        with self.subTest("no loops"):
+            self.assertEqual(Simplify.cancel_cycles(self.graph), 0)
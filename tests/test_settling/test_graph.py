@@ -1,13 +1,36 @@
 # coding=utf-8
 
+import copy
+import pickle
 from unittest import TestCase
 
-from src.simplify.base_graph import Digraph
+from src.simplify.base_graph import Digraph, GraphError
 from src.simplify.flow_graph import *
 from src.simplify.graph_objects import Edge
 from src.simplify.weighted_digraph import WeightedDigraph
 
 
+class TestVertex(TestCase):
+    def test_interned(self):
+        with self.subTest("same ID"):
+            self.assertIs(Vertex(1, label="a"), Vertex(1, label="a"))
+        with self.subTest("different label"):
+            self.assertNotEqual(Vertex(1, label="a"), Vertex(1, label="b"))
+        with self.subTest("copies"):
+            v = Vertex(2)
+            self.assertIs(v, copy.deepcopy(v))
+            self.assertIs(v, pickle.loads(pickle.dumps(v)))
+
+    def test_hash(self):
+        v = Vertex(3, label="c")
+        self.assertEqual(hash(v), hash(Vertex(3, label="c")))
+        self.assertEqual({v: 1}[Vertex(3, label="c")], 1)
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            Vertex(4).ID = 5
+
+
 class TestDigraph(TestCase):
     """Generate a digraph and some vertices"""
 
@@ -74,6 +97,23 @@ class TestDigraph(TestCase):
 
         self.assertTrue(self.graph.is_edge(w, v))
 
+    def test_edge_to(self):
+        """Index lookups match a scan of the adjacency list, parallel edges included"""
+        u, v, w = self.vertices
+
+        with self.subTest("lookup"):
+            self.assertIs(
+                self.graph.edge_to(u, w), self.graph.edge_from_nodes(w, self.graph[u])
+            )
+        with self.subTest("missing"), self.assertRaises(GraphError):
+            self.graph.edge_to(w, u)
+        with self.subTest("parallel"):
+            self.graph.add_edge(u, v)
+            self.graph.pop_edge(u, v)
+            self.assertTrue(self.graph.is_edge(u, v))
+            self.graph.pop_edge(u, v)
+            self.assertFalse(self.graph.is_edge(u, v))
+
     def test_nodes(self):
         self.assertEqual(self.vertices, self.graph.nodes())
 
@@ -107,3 +147,7 @@ class TestWeightedDigraph(TestCase):
         for node, flow in zip(self.vertices, [3, 2, -5]):
             with self.subTest(node):
                 self.assertEqual(self.graph.flow_through(node), flow)
+
+    def test_net_debts(self):
+        u, v, w = self.vertices
+        self.assertEqual(self.graph.net_debts(), {u: 3, v: 2, w: -5})
@@ -0,0 +1,43 @@
+# coding=utf-8
+import os
+import tempfile
+from unittest import TestCase
+
+from src.simplify.flow_graph import FlowGraph
+from src.simplify.graph_objects import Vertex
+from src.simplify.render import RenderQueue
+
+
+class TestRender(TestCase):
+    def setUp(self) -> None:
+        self.graph = FlowGraph([Vertex(0, "d"), Vertex(1, "m"), Vertex(2, "t")])
+        d, m, t = self.graph.nodes()
+        self.graph.add_edge(d, (m, 5), (t, 10))
+
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_write_dot(self):
+        path = os.path.join(self.directory.name, "graph")
+        self.graph.write_dot(path)
+
+        with open(path) as dot_file:
+            source = dot_file.read()
+
+        self.assertEqual(source, f"digraph {{ {''.join(self.graph.dot_lines())} }}")
+        self.assertIn('d -> t [label="  0/10  "]', source)
+
+    def test_render_queue(self):
+        """Graphs are snapshotted when submitted, and drawn in the background"""
+        renders = RenderQueue(self.directory.name)
+        renders.submit(self.graph, n=1, title="settled")
+
+        # changes after submitting don't make it into the render
+        d, m, t = self.graph.nodes()
+        self.graph.pop_edge(d, t)
+        renders.join()
+
+        with open(os.path.join(self.directory.name, "settled1")) as dot_file:
+            self.assertIn("d -> t", dot_file.read())
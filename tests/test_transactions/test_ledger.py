@@ -1,13 +1,15 @@
 # coding=utf-8
+import concurrent.futures
 import os
 import pathlib
 import unittest
+from unittest import mock
 
 import src.simplify.flow_graph
 import src.simplify.graph_objects
 from src.crypto import keys
 from src.transactions.ledger import *
-from src.transactions.transaction import VerificationError
+from src.transactions.transaction import VerificationError, verify_batch
 
 
 def setUpModule():
@@ -21,6 +23,13 @@ def key_path(usr: str, keytype="private") -> str:
     return f"./src/crypto/sample_keys/{usr}_{keytype}-key.pe{'m' if keytype == 'private' else ''}"
 
 
+class CrashingLedger(Ledger):
+    """Takes the worker settling it down with it; top level, so it can be sent to one"""
+
+    def simplify_ledger(self, **options):
+        os._exit(1)
+
+
 class TestLedger(unittest.TestCase):
     def setUp(self) -> None:
 
@@ -67,6 +76,10 @@ class TestLedger(unittest.TestCase):
         )
         self.assertEqual(len(ledger_list), 3)
 
+    def test_balances(self):
+        self.assertEqual(self.valid.balances(), {4: 15, 13: -15, 20: 0})
+        self.assertEqual(Ledger().balances(), {})
+
     def test_verify_transactions(self):
         """
         Make three ledgers:
@@ -150,3 +163,165 @@ class TestLedger(unittest.TestCase):
         trn = Transaction(4, 13, 15, self.d_pub, self.m_pub)
 
         self.assertEqual(self.valid.ledger, [trn])
+
+    def test_streaming_ledger(self):
+        """Streaming a group's transactions through gives the same graph and
+        settlement as holding on to them"""
+        with self.subTest("unsigned"), self.assertRaises(VerificationError):
+            StreamingLedger.from_stream(self.valid.ledger)
+
+        self.sign()
+        stream = StreamingLedger.from_stream(iter(self.valid.ledger))
+
+        with self.subTest("folded"):
+            self.assertEqual(stream.transactions, 3)
+            self.assertEqual(stream.balances(), self.valid.balances())
+            self.assertEqual(stream._as_flow(), self.valid._as_flow())
+            self.assertEqual(str(stream._as_flow()), str(self.valid._as_flow()))
+            self.assertEqual(stream.nodes, self.valid.nodes)
+
+        with self.subTest("settle"):
+            stream.simplify_ledger()
+            self.assertEqual(
+                stream.ledger, [Transaction(4, 13, 15, self.d_pub, self.m_pub)]
+            )
+
+        with self.subTest("csv"):
+            rows = LedgerLoader.read_csv("./tests/test_transactions/mock_db.csv")
+            self.assertEqual(sorted({group for group, _ in rows}), [0, 1, 2])
+
+    def test_settlement(self):
+        """Settling a group bit by bit as transactions come in"""
+        self.sign()
+        d, m, t = Vertex(4), Vertex(13), Vertex(20)
+
+        settlement = Settlement()
+        for trn in self.valid.ledger:
+            settlement.absorb(trn)
+
+        with self.subTest("first settle"):
+            self.assertEqual(
+                settlement.settle(), [Transaction(4, 13, 15, self.d_pub, self.m_pub)]
+            )
+
+        def new_transaction(src, dest, amount, ID) -> Transaction:
+            trn = Transaction(
+                src, dest, amount, self.valid.key_map[src], self.valid.key_map[dest], ID
+            )
+            trn.sign(self.d_m_t_keys[src], origin="src")
+            trn.sign(self.d_m_t_keys[dest], origin="dest")
+            return trn
+
+        with self.subTest("nothing to simplify"), self.assertRaises(
+            NoFutherSimplifications
+        ):
+            settlement.absorb(new_transaction(13, 20, 5, 10))
+            settlement.settle()
+
+        with self.subTest("absorbed twice"):
+            settlement.absorb(new_transaction(13, 20, 5, 10))
+            self.assertEqual(settlement.graph.net_debt[m], -10)
+
+        with self.subTest("reroutes around new debt"):
+            settlement.absorb(new_transaction(4, 20, 5, 11))
+            settled = settlement.settle()
+            settled.sort(key=lambda trn: trn.dest)
+
+            self.assertEqual(
+                [(trn.src, trn.dest, trn.amount) for trn in settled],
+                [(4, 13, 10), (4, 20, 10)],
+            )
+            self.assertEqual(settlement.graph.net_debt, {d: 20, m: -10, t: -10})
+
+        with self.subTest("unsigned"), self.assertRaises(VerificationError):
+            settlement.absorb(Transaction(4, 13, 1, self.d_pub, self.m_pub, 12))
+
+        settlement.pushed({13})
+        with self.subTest("pushed, unsigned"), self.assertRaises(VerificationError):
+            settlement.absorb(Transaction(4, 13, 10, self.d_pub, self.m_pub, 13))
+
+        with self.subTest("pushed, signed"):
+            settlement.absorb(new_transaction(4, 13, 10, 13))
+            self.assertEqual(settlement.absorbed, {13})
+            self.assertEqual(settlement.graph.net_debt, {d: 20, m: -10, t: -10})
+
+        with self.subTest("batch, one unsigned"), self.assertRaises(VerificationError):
+            settlement.absorb_all(
+                [
+                    new_transaction(13, 20, 5, 14),
+                    Transaction(4, 13, 1, self.d_pub, self.m_pub, 15),
+                ]
+            )
+        self.assertEqual(settlement.absorbed, {13})
+
+        with self.subTest("batch"), mock.patch(
+            "src.transactions.ledger.verify_batch", wraps=verify_batch
+        ) as batch:
+            settlement.absorb_all(
+                [new_transaction(4, 13, 10, 13), new_transaction(13, 20, 5, 14)]
+            )
+            self.assertEqual(batch.call_count, 1)
+            self.assertEqual(len(batch.call_args.args[0]), 1)
+            self.assertEqual(settlement.absorbed, {13, 14})
+            self.assertEqual(settlement.graph.net_debt[t], -15)
+
+    def test_simplify_all(self):
+        """Batch settling yields every group, errors included, as they finish"""
+        self.sign()
+
+        results = sorted(
+            LedgerLoader.simplify_all(
+                [self.valid, self.missing_key], workers=2, timeout=60
+            ),
+            key=lambda result: result.index,
+        )
+
+        with self.subTest("settled"):
+            self.assertIsNone(results[0].error)
+            self.assertEqual(
+                results[0].ledger.ledger,
+                [Transaction(4, 13, 15, self.d_pub, self.m_pub)],
+            )
+        with self.subTest("unverified"):
+            self.assertIsInstance(results[1].error, VerificationError)
+
+        with self.subTest("timeout"):
+            (result,) = LedgerLoader.simplify_all([self.invalid], timeout=1e-6)
+            self.assertIsInstance(result.error, TimeoutError)
+
+        with self.subTest("no nested pools"), mock.patch(
+            "src.transactions.ledger.verify_batch", wraps=verify_batch
+        ) as verify:
+            list(LedgerLoader.simplify_all([self.valid], workers=None))
+            self.assertEqual(verify.call_args.kwargs, {"workers": 1})
+
+        with self.subTest("timeout off the main thread"), self.assertLogs(
+            "src.transactions.ledger", "WARNING"
+        ):
+            with concurrent.futures.ThreadPoolExecutor(1) as pool:
+                (result,) = pool.submit(
+                    list, LedgerLoader.simplify_all([self.invalid], timeout=1e-6)
+                ).result()
+            self.assertIsInstance(result.error, VerificationError)
+
+    def test_simplify_all_failures(self):
+        """Anything going wrong settling a group only fails that group"""
+        self.sign()
+
+        with self.subTest("any error"), mock.patch.object(
+            Ledger, "simplify_ledger", side_effect=KeyError(4)
+        ):
+            (result,) = LedgerLoader.simplify_all([self.valid])
+            self.assertIsInstance(result.error, KeyError)
+
+        with self.subTest("worker died"):
+            results = sorted(
+                LedgerLoader.simplify_all(
+                    [CrashingLedger(), self.valid], workers=2, max_pending=1
+                ),
+                key=lambda result: result.index,
+            )
+            self.assertIsInstance(
+                results[0].error, concurrent.futures.process.BrokenProcessPool
+            )
+            self.assertIsNone(results[1].error)
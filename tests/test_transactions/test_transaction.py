@@ -83,6 +83,18 @@ class TestTransaction(unittest.TestCase):
         with self.subTest("verify >1 param"):
             self.trn.verify()
 
+        with self.subTest("cached"):
+            hits = cache.verifications.hits
+            self.trn.verify()
+            self.assertEqual(cache.verifications.hits, hits + 2)
+
+        with self.subTest("batch"):
+            unsigned = Transaction(0, 1, 5, self.pub_key, self.pub_key)
+            self.assertEqual(
+                verify_batch([self.trn, unsigned, self.trn.checks()[0]]),
+                [True, False, True],
+            )
+
         with self.subTest("bad key"), self.assertRaises(VerificationError):
             # edit pub key, thus should fail
             self.pub_key.lookup["n"] = 3